@@ -0,0 +1,122 @@
+'''
+Business: Бенчмарк холодного старта функций - время импорта index.py и первого вызова handler в новом процессе
+Args: --runs - число свежих процессов на функцию, --top - сколько самых дорогих импортов показать
+      DATABASE_URL - если задан, дополнительно замеряется первый GET из tests.json функции
+Returns: печатает медианы по каждой функции и самые дорогие импорты по данным python -X importtime
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from common import BACKEND_ROOT, FUNCTIONS
+
+IMPORT_MARKER = '__bench_cold_start_marker__'
+
+PROBE = r'''
+import importlib.util, json, sys, time
+sys.stderr.write('import time: %(marker)s\n')
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('index', %(path)r)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+
+class Context:
+    request_id = 'bench-cold-start'
+    function_name = %(name)r
+
+module.handler({'httpMethod': 'OPTIONS', 'headers': {}, 'queryStringParameters': {}, 'body': ''}, Context())
+options_done = time.perf_counter()
+
+first_get = None
+event = %(event)r
+if event is not None:
+    before = time.perf_counter()
+    response = module.handler(event, Context())
+    first_get = {'ms': (time.perf_counter() - before) * 1000, 'status': response['statusCode']}
+
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'options_ms': (options_done - imported) * 1000,
+    'first_get': first_get
+}))
+'''
+
+
+def first_get_event(function_name: str) -> Optional[Dict[str, Any]]:
+    """Первый GET-сценарий из tests.json функции в формате event"""
+    with open(os.path.join(BACKEND_ROOT, function_name, 'tests.json')) as f:
+        tests = json.load(f)['tests']
+    for test in tests:
+        if test['method'] == 'GET':
+            url = urlsplit(test['path'])
+            return {
+                'httpMethod': 'GET',
+                'headers': test.get('headers', {}),
+                'queryStringParameters': dict(parse_qsl(url.query)),
+                'body': ''
+            }
+    return None
+
+
+def run_probe(function_name: str, with_db: bool, importtime: bool) -> Tuple[Dict[str, Any], str]:
+    code = PROBE % {
+        'marker': IMPORT_MARKER,
+        'path': os.path.join(BACKEND_ROOT, function_name, 'index.py'),
+        'name': function_name,
+        'event': first_get_event(function_name) if with_db else None
+    }
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    result = subprocess.run(command, capture_output=True, text=True, env=os.environ.copy(), check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def top_imports(stderr: str, top: int) -> List[Tuple[str, int]]:
+    """Самые дорогие импорты верхнего уровня, сделанные index.py (по cumulative, мкс)"""
+    lines = stderr.splitlines()
+    start = next(i for i, line in enumerate(lines) if IMPORT_MARKER in line) + 1
+    modules = []
+    for line in lines[start:]:
+        if not line.startswith('import time:'):
+            continue
+        parts = line.split('|')
+        cumulative = int(parts[1].strip())
+        name = parts[2]
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            modules.append((name.strip(), cumulative))
+    return sorted(modules, key=lambda item: -item[1])[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    with_db = bool(os.environ.get('DATABASE_URL'))
+
+    for name in FUNCTIONS:
+        samples = [run_probe(name, with_db, importtime=False)[0] for _ in range(args.runs)]
+        import_ms = statistics.median(s['import_ms'] for s in samples)
+        options_ms = statistics.median(s['options_ms'] for s in samples)
+        line = f'{name:14} import {import_ms:7.2f} ms   first OPTIONS {options_ms:6.3f} ms'
+        if with_db:
+            gets = [s['first_get'] for s in samples if s['first_get']]
+            if gets:
+                line += f"   first GET {statistics.median(g['ms'] for g in gets):7.2f} ms (status {gets[0]['status']})"
+        print(line)
+
+        _, stderr = run_probe(name, False, importtime=True)
+        for module, cumulative in top_imports(stderr, args.top):
+            print(f'{"":16}{cumulative / 1000:7.2f} ms  {module}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+'''
+Business: Бенчмарк подготовленных запросов на истории бронирований - время планирования и полное время
+          запроса обычным execute и через EXECUTE подготовленного bookings_history_first
+Args: DATABASE_URL - база с историей бронирований, --client-id - по умолчанию
+      клиент с наибольшим числом записей, --runs, --limit
+Returns: печатает Planning Time из EXPLAIN ANALYZE и медиану/p95 времени выполнения для обоих вариантов
+'''
+
+import argparse
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from common import load_handler
+
+
+def explain_timings(cursor, sql: str, params: Tuple[Any, ...]) -> Tuple[float, float]:
+    """Planning Time и Execution Time в мс из EXPLAIN (ANALYZE, SUMMARY)"""
+    cursor.execute(f'EXPLAIN (ANALYZE, SUMMARY) {sql}', params)
+    lines = [list(row.values())[0] for row in cursor.fetchall()]
+    timings: Dict[str, float] = {}
+    for line in lines:
+        for label in ('Planning Time', 'Execution Time'):
+            if line.startswith(label):
+                timings[label] = float(line.split(':')[1].split()[0])
+    return timings.get('Planning Time', 0.0), timings.get('Execution Time', 0.0)
+
+
+def summarize(samples: List[float]) -> str:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return f'median {statistics.median(ordered):7.3f} ms   p95 {p95:7.3f} ms'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--client-id', type=int)
+    parser.add_argument('--runs', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    load_handler('bookings')
+    from shared.db import get_db_connection, release_connection
+    from shared.prepared import STATEMENTS
+
+    statement = STATEMENTS['bookings_history_first']
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        client_id = args.client_id
+        if client_id is None:
+            cursor.execute("SELECT client_id FROM bookings GROUP BY client_id ORDER BY COUNT(*) DESC LIMIT 1")
+            row = cursor.fetchone()
+            if not row:
+                sys.exit('No bookings in DATABASE_URL; generate data first')
+            client_id = row['client_id']
+        params = (client_id, args.limit + 1)
+
+        # Первые пять выполнений подготовленного запроса Postgres планирует заново (custom plan),
+        # дальше переходит на общий план; прогрев выводит его на установившийся режим
+        for _ in range(10):
+            statement.execute(cursor, params)
+            cursor.fetchall()
+
+        plain_planning, plain_execution = explain_timings(cursor, statement.sql, params)
+        prepared_planning, prepared_execution = explain_timings(cursor, statement.execute_sql, params)
+        print(f'client {client_id}, limit {args.limit}')
+        print(f'plain     planning {plain_planning:7.3f} ms   execution {plain_execution:7.3f} ms')
+        print(f'prepared  planning {prepared_planning:7.3f} ms   execution {prepared_execution:7.3f} ms')
+
+        def measure(run) -> List[float]:
+            samples = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                run()
+                cursor.fetchall()
+                samples.append((time.perf_counter() - started) * 1000)
+            conn.rollback()
+            return samples
+
+        plain = measure(lambda: cursor.execute(statement.sql, params))
+        prepared = measure(lambda: statement.execute(cursor, params))
+        print(f'plain     {summarize(plain)}')
+        print(f'prepared  {summarize(prepared)}')
+        print(f'saved per call: {statistics.median(plain) - statistics.median(prepared):.3f} ms (median)')
+    finally:
+        release_connection(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+'''
+Business: Микробенчмарк расчёта свободных слотов - прежний цикл по 30-минутным шагам против интервального прохода
+Args: --bookings - число броней за день, --repeat - число повторов замера
+Returns: печатает время одного расчёта для обоих вариантов и проверяет совпадение результатов
+'''
+
+import argparse
+import random
+import timeit
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List
+
+from common import BACKEND_ROOT  # noqa: F401 - добавляет backend в sys.path
+from shared.slots import day_slots
+
+
+def legacy_slots(parsed_date: date, schedule: Dict[str, Any], booked_slots: List[Dict[str, Any]]) -> List[str]:
+    """Прежняя реализация get_available_slots без обращений к базе"""
+    all_slots = []
+    current = datetime.combine(parsed_date, schedule['start_time'])
+    end = datetime.combine(parsed_date, schedule['end_time'])
+
+    while current < end:
+        slot_time = current.strftime('%H:%M')
+        is_available = True
+
+        for booked in booked_slots:
+            booked_start = datetime.combine(parsed_date, booked['start_time'])
+            booked_end = datetime.combine(parsed_date, booked['end_time'])
+
+            if booked_start <= current < booked_end:
+                is_available = False
+                break
+
+        if is_available:
+            all_slots.append(slot_time)
+
+        current += timedelta(minutes=30)
+
+    return all_slots
+
+
+def make_day(bookings_count: int, seed: int = 42):
+    """Рабочий день 00:00-23:30 и случайные брони по сетке 30 минут"""
+    rng = random.Random(seed)
+    schedule = {'start_time': time(0, 0), 'end_time': time(23, 30)}
+    starts = sorted(rng.sample(range(0, 46), min(bookings_count, 46)))
+    booked = []
+    for step in starts:
+        start = datetime.combine(date.today(), time(0, 0)) + timedelta(minutes=30 * step)
+        booked.append({'start_time': start.time(), 'end_time': (start + timedelta(minutes=30)).time()})
+    return schedule, booked
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookings', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    parsed_date = date(2025, 11, 11)
+    schedule, booked = make_day(args.bookings)
+
+    assert legacy_slots(parsed_date, schedule, booked) == day_slots(schedule, booked), 'results differ'
+
+    legacy = timeit.timeit(lambda: legacy_slots(parsed_date, schedule, booked), number=args.repeat)
+    sweep = timeit.timeit(lambda: day_slots(schedule, booked), number=args.repeat)
+
+    print(f'bookings per day: {len(booked)}, repeats: {args.repeat}')
+    print(f'legacy loop:    {legacy / args.repeat * 1e6:9.1f} us/call')
+    print(f'interval sweep: {sweep / args.repeat * 1e6:9.1f} us/call')
+    print(f'speedup:        {legacy / sweep:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+'''
+Business: Проверка планов запросов на данных продакшен-объёма - сценарии вызывают handler всех функций,
+          перед каждым их SQL тот же запрос выполняется под EXPLAIN (ANALYZE, BUFFERS) в точке сохранения
+          транзакции обработчика, которая затем откатывается
+Args: DATABASE_URL - база с данными generate_data.py или --disposable (BENCH_ADMIN_DATABASE_URL, данные
+      генерируются с --scale), --budget-ms - бюджет времени выполнения одного запроса, --seq-scan-min-rows -
+      с какого размера таблицы Seq Scan считается регрессией, --runs - повторов EXPLAIN на запрос
+Returns: печатает время, буферы и план каждого запроса; код выхода 1, если план перешёл на Seq Scan
+         по большой таблице, запрос не уложился в бюджет или не выполнился под EXPLAIN, либо сценарий
+         ответил не EXPECTED_STATUS
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from common import Context, FUNCTIONS, load_handler
+
+# Запросы с заведомо большим объёмом работы получают свой бюджет вместо --budget-ms
+BUDGETS_MS = {
+    'bookings master_stats': 250.0,
+    'bookings earliest': 150.0,
+    'bookings slots_range': 100.0,
+}
+EXPLAINED_STATEMENTS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+# Сценарии рассчитаны на успешный ответ: иной код значит, что обработчик выполнил не все свои запросы
+EXPECTED_STATUS = 200
+
+# (SQL, план, медиана Execution Time, ошибка EXPLAIN) запросов текущего сценария
+Explained = Tuple[str, Optional[Dict[str, Any]], Optional[float], Optional[str]]
+
+_recording: Optional[List[Explained]] = None
+_runs = 1
+
+
+def explain_in_place(conn, sql: str, params: Any, runs: int) -> Tuple[Dict[str, Any], float]:
+    """
+    План последнего прогона и медиана Execution Time в том состоянии, которое увидит сам запрос обработчика.
+    Каждый прогон откатывается к точке сохранения (в autocommit - своей транзакцией), поэтому вставки
+    и обновления не конфликтуют с последующим настоящим выполнением
+    """
+    from psycopg2.extras import RealDictCursor
+
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    if conn.autocommit:
+        begin, undo = 'BEGIN', 'ROLLBACK'
+    else:
+        begin, undo = 'SAVEPOINT plan_check', 'ROLLBACK TO SAVEPOINT plan_check; RELEASE SAVEPOINT plan_check'
+    timings = []
+    plan: Dict[str, Any] = {}
+    for _ in range(runs):
+        cursor.execute(begin)
+        try:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params)
+            plan = list(cursor.fetchone().values())[0][0]
+        finally:
+            cursor.execute(undo)
+        timings.append(plan['Execution Time'])
+    return plan, statistics.median(timings)
+
+
+def make_recording_cursor():
+    """Курсор обработчиков, который, пока идёт запись, объясняет каждый запрос перед его выполнением"""
+    from shared.timing import instrumented_cursor_class
+
+    class RecordingCursor(instrumented_cursor_class()):
+        def execute(self, query, vars=None):
+            sql = query if isinstance(query, str) else query.decode()
+            if _recording is not None and sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+                try:
+                    plan, execution_ms = explain_in_place(self.connection, sql, vars, _runs)
+                    _recording.append((sql, plan, execution_ms, None))
+                except Exception as e:
+                    _recording.append((sql, None, None, f'{type(e).__name__}: {e}'.rstrip()))
+            return super().execute(query, vars)
+
+    return RecordingCursor
+
+
+@contextlib.contextmanager
+def recording(runs: int) -> Iterator[List[Explained]]:
+    global _recording, _runs
+    _recording, _runs = [], runs
+    try:
+        yield _recording
+    finally:
+        _recording = None
+
+
+def user_headers(telegram_id: int) -> Dict[str, str]:
+    return {'X-Telegram-User': json.dumps({'id': telegram_id, 'first_name': 'Plan'})}
+
+
+def pick_fixtures(conn) -> Dict[str, Any]:
+    """Самые нагруженные клиент и мастер: на них индексы должны работать, а не на пустых выборках"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT u.id, u.telegram_id FROM users u
+           JOIN (SELECT client_id, COUNT(*) AS total FROM bookings GROUP BY client_id
+                 ORDER BY total DESC LIMIT 1) c ON c.client_id = u.id"""
+    )
+    client = cursor.fetchone()
+    cursor.execute(
+        """SELECT u.id, u.telegram_id FROM users u
+           JOIN (SELECT master_id, COUNT(*) AS total FROM bookings
+                 WHERE booking_date >= CURRENT_DATE GROUP BY master_id
+                 ORDER BY total DESC LIMIT 1) m ON m.master_id = u.id"""
+    )
+    master = cursor.fetchone()
+    if not client or not master:
+        conn.rollback()
+        sys.exit('No bookings in DATABASE_URL; load data with generate_data.py or use --disposable')
+
+    cursor.execute(
+        """SELECT id, name, duration_minutes FROM services WHERE master_id = %s
+           ORDER BY duration_minutes LIMIT 1""",
+        (master['id'],)
+    )
+    service = cursor.fetchone()
+    cursor.execute(
+        """SELECT day::date AS day FROM generate_series(CURRENT_DATE + 1, CURRENT_DATE + 14, interval '1 day') day
+           JOIN master_schedule s ON s.master_id = %s AND s.day_of_week = EXTRACT(ISODOW FROM day) AND s.is_active
+           ORDER BY day LIMIT 1""",
+        (master['id'],)
+    )
+    working_day = cursor.fetchone()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM notifications")
+    max_notification_id = cursor.fetchone()['max_id']
+    conn.rollback()
+    return {
+        'client': client, 'master': master, 'service': service,
+        'day': (working_day['day'] if working_day else date.today() + timedelta(days=1)).isoformat(),
+        'max_notification_id': max_notification_id
+    }
+
+
+def scenarios(fixtures: Dict[str, Any]) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """
+    (имя, функция, event) по порядку; следующие сценарии берут курсоры и id из ответов предыдущих через fixtures.
+    Записи затрагивают только созданную здесь бронь и пользователя-пробу: сгенерированные брони и уведомления
+    не меняются, меняются лишь счётчики клиента и статистика мастера от созданной брони
+    """
+    client, master, service, day = fixtures['client'], fixtures['master'], fixtures['service'], fixtures['day']
+    client_headers, master_headers = user_headers(client['telegram_id']), user_headers(master['telegram_id'])
+    probe_headers = user_headers(fixtures['probe_telegram_id'])
+    today = date.today()
+    far_day = (today + timedelta(days=300)).isoformat()
+    unknown_id = fixtures['max_notification_id'] + 1_000_000
+
+    def get(query: Dict[str, str], headers: Dict[str, str]) -> Dict[str, Any]:
+        return {'httpMethod': 'GET', 'headers': headers, 'queryStringParameters': query, 'body': ''}
+
+    def send(method: str, body: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        return {'httpMethod': method, 'headers': headers, 'queryStringParameters': {}, 'body': json.dumps(body)}
+
+    yield 'profile get', 'profile', get({}, client_headers)
+    yield 'profile bootstrap', 'profile', get({'action': 'bootstrap'}, client_headers)
+    yield 'profile create', 'profile', get({}, probe_headers)
+    yield 'profile update', 'profile', send('PUT', {'firstName': 'Plan', 'lastName': 'Probe'}, probe_headers)
+
+    yield 'bookings history', 'bookings', get({}, client_headers)
+    yield 'bookings history page 2', 'bookings', get({'cursor': fixtures.get('history_cursor') or ''},
+                                                     client_headers)
+    yield 'bookings slots', 'bookings', get({'action': 'slots', 'master_id': str(master['id']), 'date': day,
+                                             'service_id': str(service['id'])}, {})
+    yield 'bookings slots_range', 'bookings', get({'action': 'slots_range', 'master_id': str(master['id']),
+                                                   'from': today.isoformat(),
+                                                   'to': (today + timedelta(days=13)).isoformat()}, {})
+    yield 'bookings earliest', 'bookings', get({'action': 'earliest', 'service': service['name'], 'days': '14'}, {})
+    yield 'bookings master_stats', 'bookings', get({'action': 'master_stats', 'group': 'week',
+                                                    'from': (today - timedelta(days=90)).isoformat(),
+                                                    'to': today.isoformat()}, master_headers)
+
+    if fixtures.get('free_slot'):
+        yield 'bookings create', 'bookings', send('POST', {
+            'telegramUser': {'id': client['telegram_id'], 'first_name': 'Plan'}, 'masterId': master['id'],
+            'serviceId': service['id'], 'date': day, 'time': fixtures['free_slot'],
+            'duration': service['duration_minutes'], 'notes': 'query plan check'
+        }, client_headers)
+    if fixtures.get('created_booking_id'):
+        booking_id = fixtures['created_booking_id']
+        yield 'bookings complete', 'bookings', send('PUT', {'action': 'complete', 'bookingId': booking_id},
+                                                    master_headers)
+        yield 'bookings cancel', 'bookings', send('PUT', {'action': 'cancel', 'bookingId': booking_id},
+                                                  client_headers)
+        yield 'bookings cancel batch', 'bookings', send('PUT', {'action': 'cancel', 'bookingIds': [booking_id]},
+                                                        client_headers)
+    yield 'bookings cancel master days', 'bookings', send('PUT', {'action': 'cancel', 'masterId': master['id'],
+                                                                  'from': far_day, 'to': far_day}, master_headers)
+
+    yield 'notifications feed', 'notifications', get({}, client_headers)
+    yield 'notifications feed page 2', 'notifications', get({'cursor': fixtures.get('feed_cursor') or ''},
+                                                            client_headers)
+    yield 'notifications since', 'notifications', get({'since_id': str(fixtures['max_notification_id'] - 100)},
+                                                      client_headers)
+    yield 'notifications mark read', 'notifications', send('PUT', {'notificationId': unknown_id}, client_headers)
+    yield 'notifications mark read batch', 'notifications', send('PUT', {'notificationIds': [unknown_id]},
+                                                                 client_headers)
+    yield 'notifications mark all read', 'notifications', send('POST', {'action': 'mark_all_read'}, probe_headers)
+
+
+def capture(handlers: Dict[str, Any], fixtures: Dict[str, Any],
+            runs: int) -> List[Tuple[str, int, List[Explained]]]:
+    """Прогнать сценарии через handler и собрать планы выполненных ими запросов"""
+    captured = []
+    for name, function, event in scenarios(fixtures):
+        with recording(runs) as statements:
+            response = handlers[function](event, Context(function))
+        body = json.loads(response.get('body') or '{}')
+        if name == 'bookings history':
+            fixtures['history_cursor'] = body.get('nextCursor')
+        elif name == 'notifications feed':
+            fixtures['feed_cursor'] = body.get('nextCursor')
+        elif name == 'bookings slots' and body.get('slots'):
+            fixtures['free_slot'] = body['slots'][0]
+        elif name == 'bookings create':
+            fixtures['created_booking_id'] = body.get('bookingId')
+        captured.append((name, response['statusCode'], statements))
+    return captured
+
+
+def walk(node: Dict[str, Any]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    stack = [(0, node)]
+    while stack:
+        depth, current = stack.pop()
+        yield depth, current
+        stack.extend((depth + 1, child) for child in reversed(current.get('Plans', [])))
+
+
+def describe(node: Dict[str, Any]) -> str:
+    label = node['Node Type']
+    if node.get('Relation Name'):
+        label += f" on {node['Relation Name']}"
+    if node.get('Index Name'):
+        label += f" using {node['Index Name']}"
+    return f"{label}  rows={node.get('Actual Rows')} loops={node.get('Actual Loops')}"
+
+
+def table_sizes(conn) -> Dict[str, float]:
+    cursor = conn.cursor()
+    cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p', 'm')")
+    sizes = {row['relname']: row['reltuples'] for row in cursor.fetchall()}
+    conn.rollback()
+    return sizes
+
+
+def run_checks(budget_ms: float, seq_scan_min_rows: float, runs: int, verbose: bool) -> int:
+    import shared.db
+    shared.db.cursor_factory = make_recording_cursor()
+    handlers = {name: load_handler(name) for name in FUNCTIONS}
+
+    conn = shared.db.get_db_connection()
+    try:
+        fixtures = pick_fixtures(conn)
+        fixtures['probe_telegram_id'] = int(time.time())
+        print(f"client {fixtures['client']['id']}, master {fixtures['master']['id']}, "
+              f"service {fixtures['service']['id']}, day {fixtures['day']}")
+        captured = capture(handlers, fixtures, runs)
+        sizes = table_sizes(conn)
+
+        failures = 0
+        for name, status, statements in captured:
+            print(f'\n{name}  (HTTP {status}, {len(statements)} queries)')
+            if status != EXPECTED_STATUS:
+                failures += 1
+                print(f'  FAIL  HTTP {status}, expected {EXPECTED_STATUS}: the scenario did not run all its queries')
+            budget = BUDGETS_MS.get(name, budget_ms)
+            for sql, plan, execution_ms, error in statements:
+                if error is not None:
+                    failures += 1
+                    print(f'  FAIL  {" ".join(sql.split())[:90]}\n        {error}')
+                    continue
+
+                problems = []
+                for _, node in walk(plan['Plan']):
+                    relation = node.get('Relation Name')
+                    if node['Node Type'] == 'Seq Scan' and sizes.get(relation, 0) >= seq_scan_min_rows:
+                        problems.append(f'Seq Scan on {relation} (~{int(sizes[relation])} rows)')
+                if execution_ms > budget:
+                    problems.append(f'{execution_ms:.2f} ms over the {budget:.0f} ms budget')
+                failures += bool(problems)
+
+                top = plan['Plan']
+                print(f"  {'FAIL' if problems else 'ok  '}  {execution_ms:8.2f} ms  "
+                      f"plan {plan.get('Planning Time', 0):6.2f} ms  "
+                      f"hit {top.get('Shared Hit Blocks', 0):>7} read {top.get('Shared Read Blocks', 0):>6}  "
+                      f"{' '.join(sql.split())[:90]}")
+                for problem in problems:
+                    print(f'        {problem}')
+                if problems or verbose:
+                    for depth, node in walk(top):
+                        print(f"        {'  ' * depth}{describe(node)}")
+        return failures
+    finally:
+        shared.db.release_connection(conn)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--disposable', action='store_true', help='создать одноразовую базу и сгенерировать данные')
+    parser.add_argument('--scale', type=float, default=1.0, help='объём данных для --disposable')
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    parser.add_argument('--seq-scan-min-rows', type=float, default=10000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--verbose', action='store_true', help='печатать планы всех запросов')
+    args = parser.parse_args()
+
+    # Планы проверяются для обычных запросов и только на основной базе
+    os.environ['PREPARED_STATEMENTS'] = '0'
+    os.environ.setdefault('REQUEST_LOG', '0')
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+
+    with contextlib.ExitStack() as stack:
+        if args.disposable:
+            from generate_data import CLIENTS_PER_SCALE, MASTERS_PER_SCALE, generate
+            from local_db import disposable_database
+            import psycopg2
+            from psycopg2.extras import RealDictCursor
+
+            os.environ['DATABASE_URL'] = stack.enter_context(disposable_database())
+            conn = psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RealDictCursor)
+            try:
+                generate(conn, int(CLIENTS_PER_SCALE * args.scale), max(1, int(MASTERS_PER_SCALE * args.scale)))
+            finally:
+                conn.close()
+        failures = run_checks(args.budget_ms, args.seq_scan_min_rows, max(1, args.runs), args.verbose)
+
+    print(f'\n{failures} plan checks failed' if failures else '\nall query plans passed')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+'''
+Business: Проверка маршрутизации чтений на реплику на двух локальных Postgres - какие вызовы handler
+          обслужила основная база, а какие реплика, и что пользователь видит свои записи сразу после POST/PUT
+Args: DATABASE_URL и DATABASE_REPLICA_URL - две базы с применёнными db_migrations (реплика может быть
+      отдельным экземпляром без репликации: проверяется выбор пула, а не доставка WAL)
+      или --disposable: BENCH_ADMIN_DATABASE_URL и BENCH_REPLICA_ADMIN_DATABASE_URL двух серверов
+Returns: печатает шаги сценария с ожидаемой и фактической базой; код выхода 1 при расхождении
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+from common import Context, load_handler
+
+STICKY_SECONDS = 1.0
+
+
+def user_headers(telegram_id: int, read_primary: bool = False) -> Dict[str, str]:
+    headers = {'X-Telegram-User': json.dumps({'id': telegram_id, 'first_name': 'Replica'})}
+    if read_primary:
+        headers['X-Read-Primary'] = '1'
+    return headers
+
+
+def acquisitions(pool) -> int:
+    return pool.stats['created'] + pool.stats['reused']
+
+
+def run_checks() -> int:
+    import shared.db
+
+    primary = shared.db.get_pool()
+    replica = shared.db.get_pool(os.environ['DATABASE_REPLICA_URL'], read_only=True)
+    handlers = {name: load_handler(name) for name in ('bookings', 'profile', 'notifications')}
+    booking_date = (date.today() + timedelta(days=(1 - date.today().isoweekday()) % 7 or 7)).isoformat()
+    base_id = int(time.time())
+
+    failures = 0
+
+    def step(title: str, function: str, event: Dict[str, Any], expected: str) -> Optional[Dict[str, Any]]:
+        nonlocal failures
+        before = acquisitions(primary), acquisitions(replica)
+        response = handlers[function](
+            {'queryStringParameters': {}, 'body': '', **event}, Context(function)
+        )
+        used = [name for name, pool, count in (('primary', primary, before[0]), ('replica', replica, before[1]))
+                if acquisitions(pool) > count]
+        actual = '+'.join(used) or 'none'
+        ok = actual == expected
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {title:58} expected {expected:16} got {actual:16} "
+              f"status {response['statusCode']}")
+        return response
+
+    client, other, newcomer = base_id, base_id + 1, base_id + 2
+    slots_query = {'action': 'slots', 'master_id': '1', 'date': booking_date}
+
+    step('slots browsing goes to the replica', 'bookings',
+         {'httpMethod': 'GET', 'headers': user_headers(client), 'queryStringParameters': slots_query}, 'replica')
+    step('POST booking always goes to the primary', 'bookings', {
+        'httpMethod': 'POST', 'headers': user_headers(client),
+        'body': json.dumps({'telegramUser': {'id': client, 'first_name': 'Replica'}, 'masterId': 1,
+                            'serviceId': 1, 'date': booking_date, 'time': '12:00', 'duration': 60})
+    }, 'primary')
+    step('history right after own POST stays on the primary', 'bookings',
+         {'httpMethod': 'GET', 'headers': user_headers(client)}, 'primary')
+    step('X-Read-Primary from another container is honoured', 'bookings',
+         {'httpMethod': 'GET', 'headers': user_headers(other, read_primary=True),
+          'queryStringParameters': slots_query}, 'primary')
+    step('first profile GET creates the user on the primary', 'profile',
+         {'httpMethod': 'GET', 'headers': user_headers(newcomer)}, 'replica+primary')
+
+    time.sleep(STICKY_SECONDS + 0.2)
+    step('after the sticky window reads return to the replica', 'bookings',
+         {'httpMethod': 'GET', 'headers': user_headers(client), 'queryStringParameters': slots_query}, 'replica')
+    step('notifications PUT goes to the primary', 'notifications', {
+        'httpMethod': 'PUT', 'headers': user_headers(client), 'body': json.dumps({'notificationIds': [1]})
+    }, 'primary')
+
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--disposable', action='store_true', help='создать одноразовые базы на обоих серверах')
+    args = parser.parse_args()
+
+    os.environ['REPLICA_STICKY_SECONDS'] = str(STICKY_SECONDS)
+    os.environ.setdefault('REQUEST_LOG', '0')
+
+    with contextlib.ExitStack() as stack:
+        if args.disposable:
+            from local_db import disposable_database
+            os.environ['DATABASE_URL'] = stack.enter_context(disposable_database())
+            os.environ['DATABASE_REPLICA_URL'] = stack.enter_context(
+                disposable_database(os.environ['BENCH_REPLICA_ADMIN_DATABASE_URL'])
+            )
+        if not os.environ.get('DATABASE_REPLICA_URL'):
+            sys.exit('DATABASE_REPLICA_URL is not set')
+        failures = run_checks()
+
+    print(f'{failures} failed checks' if failures else 'all checks passed')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+'''
+Business: Общие помощники для бенчмарков и нагрузочных проверок backend
+Args: имя функции из backend/func2url.json
+Returns: handler функции и объект context, как их передаёт платформа
+'''
+
+import importlib.util
+import os
+import sys
+import uuid
+from typing import Any, Callable, Dict
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+FUNCTIONS = ('bookings', 'profile', 'notifications')
+
+
+class Context:
+    """Минимальный context вызова: request_id и function_name"""
+
+    def __init__(self, function_name: str):
+        self.request_id = str(uuid.uuid4())
+        self.function_name = function_name
+
+
+def load_handler(function_name: str) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    """Импорт backend/<function_name>/index.py под уникальным именем модуля"""
+    path = os.path.join(BACKEND_ROOT, function_name, 'index.py')
+    spec = importlib.util.spec_from_file_location(f'{function_name}_index', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
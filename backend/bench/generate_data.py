@@ -0,0 +1,303 @@
+'''
+Business: Генератор синтетических данных в объёмах продакшена - клиенты, мастера, услуги, расписания,
+          бронирования за год назад и на два месяца вперёд и уведомления по ним, загрузка через COPY
+Args: DATABASE_URL - база с применёнными db_migrations без параллельной записи (id выдаются от текущего
+      максимума), --scale - множитель объёма (1 = 20 000 клиентов, 200 мастеров, ~400 тыс. записей),
+      --clients, --masters, --days-back, --days-ahead, --occupancy, --seed
+Returns: печатает число загруженных строк по таблицам и время; после загрузки пересчитаны счётчики
+         пользователей, master_daily_stats и статистика планировщика (ANALYZE)
+'''
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from common import BACKEND_ROOT  # noqa: F401 - добавляет backend в sys.path
+
+CLIENTS_PER_SCALE = 20000
+MASTERS_PER_SCALE = 200
+TELEGRAM_ID_BASE = 7_000_000_000
+COPY_CHUNK_ROWS = 2000
+
+FIRST_NAMES = ['Анна', 'Мария', 'Елена', 'Ольга', 'Дарья', 'Ксения', 'Ирина', 'Наталья', 'Юлия', 'Алина',
+               'Виктория', 'Полина', 'Софья', 'Татьяна', 'Екатерина', 'Светлана', 'Алексей', 'Иван']
+LAST_NAMES = ['Смирнова', 'Иванова', 'Петрова', 'Соколова', 'Кузнецова', 'Попова', 'Волкова', 'Козлова',
+              'Новикова', 'Морозова', 'Лебедева', 'Егорова', 'Павлова', 'Фёдорова']
+SERVICES = [('Маникюр классический', 60, 1500), ('Педикюр', 90, 2000), ('Наращивание ногтей', 120, 3000),
+            ('Дизайн ногтей', 30, 500), ('Spa-маникюр', 90, 2500), ('Стрижка', 60, 1800),
+            ('Окрашивание', 120, 4500), ('Укладка', 30, 900), ('Коррекция бровей', 30, 700),
+            ('Ламинирование ресниц', 60, 2200)]
+NOTES = ['', '', '', 'Первый визит', 'Нужна парковка', 'Аллергия на акрил', 'Опоздаю на 5 минут']
+
+# Доли статусов: прошедшие записи в основном выполнены, будущие ожидают подтверждения
+PAST_STATUSES = [('completed', 0.85), ('cancelled', 0.10), ('confirmed', 0.05)]
+FUTURE_STATUSES = [('pending', 0.50), ('confirmed', 0.40), ('cancelled', 0.10)]
+
+
+class RowStream:
+    """Файлоподобный поток строк формата COPY text: copy_expert читает его кусками, строки не копятся в памяти"""
+
+    def __init__(self, rows: Iterable[Tuple[Any, ...]]):
+        self.rows = iter(rows)
+        self.buffer = ''
+        self.count = 0
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self.buffer) < size:
+            chunk = []
+            for row in self.rows:
+                chunk.append(copy_line(row))
+                if len(chunk) >= COPY_CHUNK_ROWS:
+                    break
+            if not chunk:
+                break
+            self.count += len(chunk)
+            self.buffer += ''.join(chunk)
+        if size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def copy_line(row: Tuple[Any, ...]) -> str:
+    """Строка COPY text: NULL - \\N, значения генератора не содержат табуляций и переводов строк"""
+    return '\t'.join('\\N' if value is None else str(value) for value in row) + '\n'
+
+
+def copy_rows(cursor, table: str, columns: List[str], rows: Iterable[Tuple[Any, ...]]) -> int:
+    stream = RowStream(rows)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream)
+    return stream.count
+
+
+def weighted(rng: random.Random, choices: List[Tuple[str, float]]) -> str:
+    roll = rng.random()
+    for value, share in choices:
+        roll -= share
+        if roll < 0:
+            return value
+    return choices[-1][0]
+
+
+def next_id(cursor, table: str) -> int:
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 AS next_id FROM {table}")
+    return cursor.fetchone()['next_id']
+
+
+def ensure_partitions(cursor, parent: str, key_column: str, first: date, last: date) -> None:
+    """Месячные секции на весь диапазон данных, чтобы строки не оседали в секции по умолчанию"""
+    cursor.execute(
+        """SELECT create_month_partition(%s, %s, month::date)
+           FROM generate_series(date_trunc('month', %s::date), date_trunc('month', %s::date),
+                                interval '1 month') month
+           WHERE to_regclass(%s || '_' || to_char(month, 'YYYY_MM')) IS NULL""",
+        (parent, key_column, first, last, parent)
+    )
+
+
+def generate(conn, clients: int, masters: int, days_back: int = 365, days_ahead: int = 60,
+             occupancy: float = 0.6, seed: int = 42, log: Callable[[str], None] = print) -> Dict[str, int]:
+    """Загрузить набор данных в одной транзакции; вернуть число строк по таблицам"""
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+    counts: Dict[str, int] = {}
+    now = datetime.now().replace(microsecond=0)
+    today = now.date()
+    first_day, last_day = today - timedelta(days=days_back), today + timedelta(days=days_ahead)
+
+    def step(table: str, started: float) -> None:
+        log(f'{table:22} {counts[table]:>10} rows  {time.perf_counter() - started:7.2f}s')
+
+    started = time.perf_counter()
+    first_user_id = next_id(cursor, 'users')
+    master_ids = list(range(first_user_id, first_user_id + masters))
+    client_ids = list(range(first_user_id + masters, first_user_id + masters + clients))
+    registered = now - timedelta(days=days_back + 30)
+
+    def users() -> Iterator[Tuple[Any, ...]]:
+        for user_id in master_ids + client_ids:
+            role = 'master' if user_id < first_user_id + masters else 'client'
+            yield (user_id, TELEGRAM_ID_BASE + user_id, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                   f'user{user_id}', role, f'+7999{user_id % 10_000_000:07d}',
+                   registered + timedelta(minutes=rng.randrange(days_back * 1440)))
+
+    counts['users'] = copy_rows(cursor, 'users', ['id', 'telegram_id', 'first_name', 'last_name', 'username',
+                                                  'role', 'phone', 'created_at'], users())
+    cursor.execute("SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT MAX(id) FROM users))")
+    cursor.execute(
+        """INSERT INTO master_availability_versions (master_id)
+           SELECT id FROM users WHERE id BETWEEN %s AND %s""",
+        (master_ids[0], master_ids[-1])
+    )
+    step('users', started)
+
+    started = time.perf_counter()
+    service_id = next_id(cursor, 'services')
+    services_by_master: Dict[int, List[Tuple[int, int]]] = {}
+    service_rows = []
+    for master_id in master_ids:
+        for name, duration, price in rng.sample(SERVICES, rng.randint(3, 6)):
+            service_rows.append((service_id, name, None, duration, price, master_id))
+            services_by_master.setdefault(master_id, []).append((service_id, duration))
+            service_id += 1
+    counts['services'] = copy_rows(cursor, 'services', ['id', 'name', 'description', 'duration_minutes', 'price',
+                                                        'master_id'], service_rows)
+    cursor.execute("SELECT setval(pg_get_serial_sequence('services', 'id'), (SELECT MAX(id) FROM services))")
+    step('services', started)
+
+    started = time.perf_counter()
+    schedules: Dict[int, Dict[int, Tuple[int, int]]] = {}
+    for master_id in master_ids:
+        opens = rng.choice([8, 9, 10, 11]) * 60
+        closes = opens + rng.choice([8, 9, 10]) * 60
+        days_off = rng.sample(range(1, 8), rng.choice([1, 2, 2, 3]))
+        schedules[master_id] = {day: (opens, closes) for day in range(1, 8) if day not in days_off}
+    counts['master_schedule'] = copy_rows(
+        cursor, 'master_schedule', ['master_id', 'day_of_week', 'start_time', 'end_time', 'is_active'],
+        ((master_id, day, minutes_to_time(opens), minutes_to_time(closes), 't')
+         for master_id, days in schedules.items() for day, (opens, closes) in days.items())
+    )
+    step('master_schedule', started)
+
+    started = time.perf_counter()
+    ensure_partitions(cursor, 'bookings', 'booking_date', first_day, last_day)
+    ensure_partitions(cursor, 'notifications', 'created_at', first_day - timedelta(days=30), today)
+    booking_id = next_id(cursor, 'bookings')
+    notification_rows = tempfile.TemporaryFile('w+', encoding='utf-8')
+
+    def bookings() -> Iterator[Tuple[Any, ...]]:
+        nonlocal booking_id
+        day = first_day
+        while day <= last_day:
+            past = day < today
+            for master_id, days in schedules.items():
+                hours = days.get(day.isoweekday())
+                if hours is None:
+                    continue
+                minute, closes = hours
+                while minute + 30 <= closes:
+                    fitting = [s for s in services_by_master[master_id] if minute + s[1] <= closes]
+                    if not fitting or rng.random() >= occupancy:
+                        minute += 30
+                        continue
+                    service, duration = rng.choice(fitting)
+                    # Квадрат равномерного распределения: немногие постоянные клиенты дают длинную историю
+                    client_id = client_ids[int(len(client_ids) * rng.random() ** 2)]
+                    status = weighted(rng, PAST_STATUSES if past else FUTURE_STATUSES)
+                    starts_at = datetime.combine(day, minutes_to_time(minute))
+                    created_at = min(starts_at - timedelta(minutes=rng.randrange(60, 21 * 1440)),
+                                     now - timedelta(minutes=rng.randrange(1, 600)))
+                    updated_at = created_at
+                    if status == 'cancelled':
+                        updated_at = min(created_at + (starts_at - created_at) * rng.random(), now)
+
+                    notification_rows.write(copy_line(notification(
+                        client_id, booking_id, 'booking_created', 'Запись создана',
+                        f'Ваша запись на {day.isoformat()} в {minutes_to_time(minute):%H:%M} успешно создана',
+                        created_at, now, rng
+                    )))
+                    if status == 'cancelled':
+                        notification_rows.write(copy_line(notification(
+                            client_id, booking_id, 'booking_cancelled', 'Запись отменена',
+                            f'Запись на {day.isoformat()} отменена', updated_at, now, rng
+                        )))
+
+                    yield (booking_id, client_id, master_id, service, day, minutes_to_time(minute),
+                           minutes_to_time(minute + duration), status, rng.choice(NOTES) or None,
+                           created_at, updated_at)
+                    booking_id += 1
+                    minute += duration
+            day += timedelta(days=1)
+
+    counts['bookings'] = copy_rows(cursor, 'bookings', ['id', 'client_id', 'master_id', 'service_id', 'booking_date',
+                                                        'start_time', 'end_time', 'status', 'notes', 'created_at',
+                                                        'updated_at'], bookings())
+    cursor.execute("SELECT setval(pg_get_serial_sequence('bookings', 'id'), (SELECT MAX(id) FROM bookings))")
+    step('bookings', started)
+
+    started = time.perf_counter()
+    notification_rows.seek(0)
+    notification_id = next_id(cursor, 'notifications')
+    counts['notifications'] = copy_rows(
+        cursor, 'notifications', ['id', 'user_id', 'booking_id', 'type', 'title', 'message', 'is_read', 'created_at'],
+        ((notification_id + index, *line.rstrip('\n').split('\t')) for index, line in enumerate(notification_rows))
+    )
+    notification_rows.close()
+    cursor.execute(
+        "SELECT setval(pg_get_serial_sequence('notifications', 'id'), (SELECT MAX(id) FROM notifications))"
+    )
+    step('notifications', started)
+
+    started = time.perf_counter()
+    from shared.counters import repair_counters
+    from shared.master_stats import rebuild_master_stats
+
+    repair_counters(conn, first_user_id, client_ids[-1] + 1)
+    cursor.execute(
+        """UPDATE users u SET notifications_version = n.total
+           FROM (SELECT user_id, COUNT(*) AS total FROM notifications GROUP BY user_id) n
+           WHERE u.id = n.user_id AND u.id >= %s""",
+        (first_user_id,)
+    )
+    counts['master_daily_stats'] = rebuild_master_stats(conn, first_day.isoformat(), last_day.isoformat())
+    step('master_daily_stats', started)
+
+    conn.commit()
+
+    started = time.perf_counter()
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        conn.cursor().execute("ANALYZE")
+    finally:
+        conn.autocommit = autocommit
+    log(f"{'analyze':22} {'':>10}       {time.perf_counter() - started:7.2f}s")
+    return counts
+
+
+def notification(user_id: int, booking_id: int, kind: str, title: str, message: str,
+                 created_at: datetime, now: datetime, rng: random.Random) -> Tuple[Any, ...]:
+    """Строка уведомления; всё, что старше трёх дней, почти всегда прочитано"""
+    is_read = 't' if now - created_at > timedelta(days=3) and rng.random() < 0.95 else 'f'
+    return user_id, booking_id, kind, title, message, is_read, created_at
+
+
+def minutes_to_time(minutes: int) -> dtime:
+    return dtime(minutes // 60, minutes % 60)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--clients', type=int)
+    parser.add_argument('--masters', type=int)
+    parser.add_argument('--days-back', type=int, default=365)
+    parser.add_argument('--days-ahead', type=int, default=60)
+    parser.add_argument('--occupancy', type=float, default=0.6, help='доля рабочего времени мастеров под записями')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    clients = args.clients or max(1, int(CLIENTS_PER_SCALE * args.scale))
+    masters = args.masters or max(1, int(MASTERS_PER_SCALE * args.scale))
+
+    from shared.db import get_db_connection, release_connection
+
+    conn = get_db_connection()
+    try:
+        started = time.perf_counter()
+        counts = generate(conn, clients, masters, args.days_back, args.days_ahead, args.occupancy, args.seed)
+        print(f"loaded {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        conn.rollback()
+        sys.exit(f'generation failed, nothing was loaded: {e}')
+    finally:
+        release_connection(conn)
+
+
+if __name__ == '__main__':
+    main()
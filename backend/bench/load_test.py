@@ -0,0 +1,203 @@
+'''
+Business: Нагрузочный прогон handler всех функций по сценариям из tests.json и JSONL-файлов с записанными запросами
+Args: DATABASE_URL или --disposable (BENCH_ADMIN_DATABASE_URL, база создаётся из db_migrations)
+      --concurrency, --requests-per-scenario, --replay file.jsonl, --save, --compare results.json
+Returns: печатает p50/p95/p99, пропускную способность и число SQL-запросов на запрос по каждому эндпоинту
+'''
+
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from common import BACKEND_ROOT, FUNCTIONS, Context, load_handler
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+_local = threading.local()
+
+
+def make_counting_cursor():
+    """Курсор обработчиков, который дополнительно считает выполненные запросы в текущем потоке"""
+    from shared.timing import instrumented_cursor_class
+
+    class CountingCursor(instrumented_cursor_class()):
+        def execute(self, query, vars=None):
+            _local.queries = getattr(_local, 'queries', 0) + 1
+            return super().execute(query, vars)
+
+        def executemany(self, query, vars_list):
+            _local.queries = getattr(_local, 'queries', 0) + 1
+            return super().executemany(query, vars_list)
+
+    return CountingCursor
+
+
+def to_event(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Сценарий в формате tests.json в event платформы"""
+    url = urlsplit(entry.get('path', '/'))
+    body = entry.get('body')
+    return {
+        'httpMethod': entry['method'],
+        'headers': dict(entry.get('headers') or {}),
+        'queryStringParameters': dict(parse_qsl(url.query)),
+        'body': body if isinstance(body, str) or body is None else json.dumps(body)
+    }
+
+
+def load_scenarios(replay_files: List[str]) -> Tuple[List[Dict[str, Any]], int]:
+    """Сценарии из tests.json всех функций и из JSONL-файлов (function, method, path, headers, body)"""
+    scenarios = []
+    for name in FUNCTIONS:
+        with open(os.path.join(BACKEND_ROOT, name, 'tests.json')) as f:
+            for test in json.load(f)['tests']:
+                scenarios.append({'function': name, 'name': test['name'], 'event': to_event(test)})
+
+    skipped = 0
+    for path in replay_files:
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get('function') not in FUNCTIONS or 'method' not in entry:
+                    skipped += 1
+                    continue
+                scenarios.append({
+                    'function': entry['function'],
+                    'name': entry.get('name') or f'{os.path.basename(path)}:{line_number}',
+                    'event': to_event(entry)
+                })
+    return scenarios, skipped
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(scenarios: List[Dict[str, Any]], concurrency: int, per_scenario: int) -> Dict[str, Any]:
+    import shared.db
+    shared.db.cursor_factory = make_counting_cursor()
+
+    handlers = {name: load_handler(name) for name in FUNCTIONS}
+    plan = [s for s in scenarios for _ in range(per_scenario)]
+    random.Random(1).shuffle(plan)
+
+    samples: Dict[str, Dict[str, Any]] = defaultdict(lambda: {'latencies': [], 'queries': [], 'statuses': Counter()})
+    lock = threading.Lock()
+
+    def invoke(scenario: Dict[str, Any]) -> None:
+        _local.queries = 0
+        started = time.perf_counter()
+        response = handlers[scenario['function']](dict(scenario['event']), Context(scenario['function']))
+        elapsed = (time.perf_counter() - started) * 1000
+        key = f"{scenario['function']} {scenario['event']['httpMethod']} {scenario['name']}"
+        with lock:
+            bucket = samples[key]
+            bucket['latencies'].append(elapsed)
+            bucket['queries'].append(_local.queries)
+            bucket['statuses'][response['statusCode']] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(invoke, plan))
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for key, bucket in sorted(samples.items()):
+        latencies = bucket['latencies']
+        endpoints[key] = {
+            'count': len(latencies),
+            'p50': round(percentile(latencies, 0.50), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'queriesPerRequest': round(sum(bucket['queries']) / len(bucket['queries']), 2),
+            'statuses': {str(code): count for code, count in bucket['statuses'].items()}
+        }
+
+    return {
+        'totalRequests': len(plan),
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(plan) / elapsed, 1),
+        'endpoints': endpoints
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    print(f"{result['totalRequests']} requests in {result['seconds']}s, {result['throughput']} req/s")
+    print(f"{'endpoint':60} {'p50':>8} {'p95':>8} {'p99':>8} {'q/req':>6}  statuses")
+    for key, stats in result['endpoints'].items():
+        line = (f"{key[:60]:60} {stats['p50']:8.2f} {stats['p95']:8.2f} {stats['p99']:8.2f} "
+                f"{stats['queriesPerRequest']:6.2f}  {stats['statuses']}")
+        previous = (baseline or {}).get('endpoints', {}).get(key)
+        if previous:
+            line += f"  (p95 {stats['p95'] - previous['p95']:+.2f} ms, q/req {stats['queriesPerRequest'] - previous['queriesPerRequest']:+.2f})"
+        print(line)
+    if baseline:
+        print(f"throughput vs {baseline.get('revision', '?')}: {result['throughput'] - baseline['throughput']:+.1f} req/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests-per-scenario', type=int, default=200)
+    parser.add_argument('--replay', action='append', default=[], help='JSONL с записанными запросами')
+    parser.add_argument('--disposable', action='store_true', help='создать одноразовую базу из db_migrations')
+    parser.add_argument('--save', action='store_true', help=f'сохранить результат в {RESULTS_DIR}')
+    parser.add_argument('--compare', help='файл результата прошлого прогона для сравнения')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.concurrency))
+    scenarios, skipped = load_scenarios(args.replay)
+    if skipped:
+        print(f'skipped {skipped} replay lines without function/method', file=sys.stderr)
+
+    if args.disposable:
+        from local_db import disposable_database
+        with disposable_database() as database_url:
+            os.environ['DATABASE_URL'] = database_url
+            result = run(scenarios, args.concurrency, args.requests_per_scenario)
+    else:
+        result = run(scenarios, args.concurrency, args.requests_per_scenario)
+
+    result.update({
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+        'concurrency': args.concurrency,
+        'requestsPerScenario': args.requests_per_scenario
+    })
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{result['timestamp'].replace(':', '')}-{result['revision']}.json")
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'saved {path}')
+
+
+if __name__ == '__main__':
+    main()
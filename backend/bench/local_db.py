@@ -0,0 +1,66 @@
+'''
+Business: Одноразовая локальная база для бенчмарков - создаётся на локальном Postgres и заполняется из db_migrations
+Args: BENCH_ADMIN_DATABASE_URL - подключение к служебной базе локального сервера (например .../postgres)
+Returns: disposable_database() - контекстный менеджер, отдающий DATABASE_URL новой базы и удаляющий её после
+'''
+
+import contextlib
+import glob
+import os
+import re
+import time
+from typing import Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from common import BACKEND_ROOT
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(BACKEND_ROOT), 'db_migrations')
+
+
+def migration_files() -> list:
+    """Файлы V*.sql в порядке номера версии"""
+    files = glob.glob(os.path.join(MIGRATIONS_DIR, 'V*__*.sql'))
+    return sorted(files, key=lambda path: int(re.match(r'V(\d+)__', os.path.basename(path)).group(1)))
+
+
+def apply_migrations(database_url: str) -> None:
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    try:
+        cursor = conn.cursor()
+        for path in migration_files():
+            with open(path) as f:
+                cursor.execute(f.read())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def with_database(url: str, name: str) -> str:
+    """Тот же сервер и учётные данные, другая база"""
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path='/' + name))
+
+
+@contextlib.contextmanager
+def disposable_database(admin_url: Optional[str] = None, keep: bool = False) -> Iterator[str]:
+    """Создать пустую базу, применить миграции, отдать её URL и удалить по выходе (если не keep)"""
+    import psycopg2
+
+    admin_url = admin_url or os.environ['BENCH_ADMIN_DATABASE_URL']
+    name = f'bench_{int(time.time())}_{os.getpid()}'
+
+    admin = psycopg2.connect(admin_url)
+    admin.autocommit = True
+    try:
+        admin.cursor().execute(f'CREATE DATABASE {name}')
+        database_url = with_database(admin_url, name)
+        apply_migrations(database_url)
+        yield database_url
+    finally:
+        if not keep:
+            from shared.db import close_all_pools
+            close_all_pools()
+            admin.cursor().execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+        admin.close()
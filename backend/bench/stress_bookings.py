@@ -0,0 +1,147 @@
+'''
+Business: Нагрузочная проверка создания записей - параллельные клиенты бьются за одни и те же слоты мастера
+Args: DATABASE_URL - одноразовая локальная база с применёнными db_migrations
+      --workers, --attempts, --master-id, --service-id, --date, --slots
+Returns: печатает пропускную способность и число 200/409; код выхода 1 при найденном двойном бронировании
+'''
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from common import Context, load_handler
+
+
+def next_weekday(weekday: int) -> date:
+    today = date.today()
+    return today + timedelta(days=(weekday - today.isoweekday()) % 7 or 7)
+
+
+def reset_day(conn, master_id: int, day: str) -> int:
+    """
+    Удалить записи мастера за день вместе с их уведомлениями, событиями outbox и ключами идемпотентности,
+    затем пересчитать счётчики затронутых пользователей, статистику мастера за день и версию его слотов -
+    после очистки база согласована так же, как после работы обработчиков. Возвращает число удалённых записей
+    """
+    from shared.counters import repair_counters
+    from shared.master_stats import rebuild_master_stats
+
+    cursor = conn.cursor()
+    cursor.execute(
+        """WITH doomed AS (
+               SELECT id, client_id FROM bookings WHERE master_id = %s AND booking_date = %s
+           ), notifications_gone AS (
+               DELETE FROM notifications WHERE booking_id IN (SELECT id FROM doomed) RETURNING user_id
+           ), outbox_gone AS (
+               DELETE FROM notification_outbox WHERE booking_id IN (SELECT id FROM doomed)
+           ), keys_gone AS (
+               DELETE FROM booking_idempotency_keys WHERE booking_id IN (SELECT id FROM doomed)
+           ), bookings_gone AS (
+               DELETE FROM bookings WHERE master_id = %s AND booking_date = %s RETURNING client_id
+           )
+           SELECT (SELECT COUNT(*) FROM bookings_gone) AS deleted,
+                  ARRAY(SELECT client_id FROM bookings_gone UNION SELECT user_id FROM notifications_gone) AS users""",
+        (master_id, day, master_id, day)
+    )
+    row = cursor.fetchone()
+    for user_id in sorted(row['users']):
+        repair_counters(conn, user_id, user_id + 1)
+    rebuild_master_stats(conn, day, day)
+    cursor.execute(
+        """INSERT INTO master_availability_versions (master_id, version) VALUES (%s, 1)
+           ON CONFLICT (master_id) DO UPDATE
+           SET version = master_availability_versions.version + 1, updated_at = CURRENT_TIMESTAMP""",
+        (master_id,)
+    )
+    return row['deleted']
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--attempts', type=int, default=25)
+    parser.add_argument('--master-id', type=int, default=1)
+    parser.add_argument('--service-id', type=int, default=1)
+    parser.add_argument('--date', default=next_weekday(1).isoformat())
+    parser.add_argument('--slots', type=int, default=8, help='сколько 30-минутных стартов разыгрывается')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.workers))
+    handler = load_handler('bookings')
+
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RealDictCursor)
+    reset_day(conn, args.master_id, args.date)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT start_time FROM master_schedule WHERE master_id = %s AND day_of_week = %s",
+        (args.master_id, date.fromisoformat(args.date).isoweekday())
+    )
+    row = cursor.fetchone()
+    conn.commit()
+    if not row:
+        sys.exit(f'Master {args.master_id} does not work on {args.date}')
+
+    first = row['start_time'].hour * 60 + row['start_time'].minute
+    starts = ['%02d:%02d' % divmod(first + 30 * i, 60) for i in range(args.slots)]
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+
+    def worker(worker_id: int) -> None:
+        rng = random.Random(worker_id)
+        local: Counter = Counter()
+        for attempt in range(args.attempts):
+            event = {
+                'httpMethod': 'POST',
+                'headers': {},
+                'body': json.dumps({
+                    'telegramUser': {'id': 700000000 + worker_id, 'first_name': f'Stress {worker_id}'},
+                    'masterId': args.master_id,
+                    'serviceId': args.service_id,
+                    'date': args.date,
+                    'time': rng.choice(starts),
+                    'duration': rng.choice((30, 60, 90))
+                })
+            }
+            response = handler(event, Context('bookings'))
+            local[response['statusCode']] += 1
+        with lock:
+            statuses.update(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.workers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    cursor.execute(
+        """SELECT COUNT(*) AS overlaps FROM bookings a
+           JOIN bookings b ON a.master_id = b.master_id AND a.booking_date = b.booking_date AND a.id < b.id
+           WHERE a.master_id = %s AND a.booking_date = %s
+             AND a.status != 'cancelled' AND b.status != 'cancelled'
+             AND a.start_time < b.end_time AND b.start_time < a.end_time""",
+        (args.master_id, args.date)
+    )
+    overlaps = cursor.fetchone()['overlaps']
+    conn.close()
+
+    total = sum(statuses.values())
+    print(f'requests: {total} in {elapsed:.2f}s ({total / elapsed:.1f} req/s), workers: {args.workers}')
+    print('statuses: ' + ', '.join(f'{code}={count}' for code, count in sorted(statuses.items())))
+    print(f'double bookings: {overlaps}')
+
+    if overlaps or statuses.get(500):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
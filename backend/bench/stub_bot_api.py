@@ -0,0 +1,74 @@
+'''
+Business: Локальная заглушка Telegram Bot API для проверки воркера уведомлений
+Args: --port, --delay (мс на ответ), --fail-rate (доля 500), --throttle-rate (доля 429 с retry_after)
+Returns: отвечает на POST /bot<token>/sendMessage как Bot API; при остановке печатает число вызовов
+'''
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+calls: Counter = Counter()
+calls_lock = threading.Lock()
+
+
+def make_handler(args):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            time.sleep(args.delay / 1000)
+
+            roll = random.random()
+            if not self.path.endswith('/sendMessage'):
+                status, body = 404, {'ok': False, 'description': 'Not Found'}
+            elif roll < args.throttle_rate:
+                status, body = 429, {'ok': False, 'description': 'Too Many Requests',
+                                     'parameters': {'retry_after': 1}}
+            elif roll < args.throttle_rate + args.fail_rate:
+                status, body = 500, {'ok': False, 'description': 'Internal Server Error'}
+            else:
+                status, body = 200, {'ok': True, 'result': {'chat': {'id': payload.get('chat_id')},
+                                                            'text': payload.get('text')}}
+
+            with calls_lock:
+                calls[status] += 1
+
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--delay', type=float, default=50)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args))
+    print(f'stub Bot API on http://127.0.0.1:{args.port} (set TELEGRAM_API_URL to this address)', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print('calls: ' + ', '.join(f'{code}={count}' for code, count in sorted(calls.items())))
+
+
+if __name__ == '__main__':
+    main()
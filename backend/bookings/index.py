@@ -7,190 +7,495 @@ Returns: HTTP response dict с данными бронирований
 
 import json
 import os
-from typing import Dict, Any, Optional, List
+import sys
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, date, time, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
 
-def get_db_connection():
-    """Создание подключения к базе данных"""
-    database_url = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
 
-def get_or_create_user(conn, telegram_user: Dict[str, Any]) -> int:
-    """Получить или создать пользователя из данных Telegram"""
+from shared.db import get_db_connection, get_read_connection, mark_write, release_connection, reroute_if_written
+from shared.http import error_response, int_param, json_response, preflight_response, request_telegram_id, wants_primary
+from shared.timing import instrument, timed
+from shared.cache import LRUCache
+from shared.users import is_master, resolve_user_id
+from shared.counters import increment_bookings_count
+from shared.outbox import enqueue_notification, enqueue_notifications
+from shared.batch import InvalidBatch, batch_results, parse_ids
+from shared.master_stats import record_booking_changes
+from shared.idempotency import IdempotencyConflict, claim_key, complete_key, idempotency_key, request_fingerprint
+from shared.pagination import InvalidCursor, decode_cursor, encode_cursor, parse_limit
+from shared.prepared import prepare
+from shared.slots import (
+    SLOT_STEP_MINUTES, MAX_RANGE_DAYS, to_minutes, day_slots, range_slots, earliest_slots, parse_date_range
+)
+
+EXCLUSION_VIOLATION = '23P01'
+# Ключ сортировки истории в курсоре: booking_date, start_time, id
+HISTORY_CURSOR_KEY = ('date', 'time', 'int')
+MAX_STATS_RANGE_DAYS = 366
+
+# Поля тела POST, которые определяют запись: у повтора с тем же Idempotency-Key они должны совпадать
+BOOKING_FINGERPRINT_FIELDS = ('masterId', 'serviceId', 'date', 'time', 'duration', 'notes')
+REPLAYED_HEADERS = {'Idempotent-Replayed': 'true', 'Access-Control-Expose-Headers': 'Idempotent-Replayed'}
+
+SLOT_CACHE = LRUCache(
+    max_size=int(os.environ.get('SLOT_CACHE_SIZE', '2048')),
+    ttl=float(os.environ.get('SLOT_CACHE_TTL', '300'))
+)
+
+SCHEDULE_FOR_DAY = prepare('bookings_schedule_for_day', """
+    SELECT start_time, end_time FROM master_schedule
+    WHERE master_id = %s AND day_of_week = %s AND is_active = true""")
+
+BOOKED_INTERVALS = prepare('bookings_booked_intervals', """
+    SELECT start_time, end_time FROM bookings
+    WHERE master_id = %s AND booking_date = %s AND status != 'cancelled'""")
+
+HISTORY_QUERY = """
+    SELECT b.id, b.booking_date, b.start_time, b.end_time, b.status, b.notes,
+           m.first_name as master_name, s.name as service_name, s.price
+    FROM bookings b
+    JOIN users m ON b.master_id = m.id
+    JOIN services s ON b.service_id = s.id
+    WHERE b.client_id = %s {keyset}
+    ORDER BY b.booking_date DESC, b.start_time DESC, b.id DESC
+    LIMIT %s"""
+
+HISTORY_FIRST_PAGE = prepare('bookings_history_first', HISTORY_QUERY.format(keyset=''))
+HISTORY_NEXT_PAGE = prepare('bookings_history_after', HISTORY_QUERY.format(
+    keyset='AND (b.booking_date, b.start_time, b.id) < (%s::date, %s::time, %s)'
+))
+
+def get_master_version(conn, master_id: int) -> int:
+    """Текущая версия доступности мастера (одно чтение по первичному ключу)"""
     cursor = conn.cursor()
-    
-    telegram_id = telegram_user.get('id')
-    first_name = telegram_user.get('first_name', 'User')
-    last_name = telegram_user.get('last_name', '')
-    username = telegram_user.get('username', '')
-    
     cursor.execute(
-        "SELECT id FROM users WHERE telegram_id = %s",
-        (telegram_id,)
+        "SELECT version FROM master_availability_versions WHERE master_id = %s",
+        (master_id,)
     )
-    result = cursor.fetchone()
-    
-    if result:
-        return result['id']
-    
+    row = cursor.fetchone()
+    return row['version'] if row else 0
+
+def bump_master_version(conn, master_id: int) -> None:
+    """Увеличить версию доступности мастера в текущей транзакции"""
+    cursor = conn.cursor()
     cursor.execute(
-        """INSERT INTO users (telegram_id, first_name, last_name, username, role) 
-           VALUES (%s, %s, %s, %s, %s) RETURNING id""",
-        (telegram_id, first_name, last_name, username, 'client')
+        """INSERT INTO master_availability_versions (master_id, version) VALUES (%s, 1)
+           ON CONFLICT (master_id) DO UPDATE
+           SET version = master_availability_versions.version + 1, updated_at = CURRENT_TIMESTAMP""",
+        (master_id,)
     )
-    user_id = cursor.fetchone()['id']
-    conn.commit()
-    return user_id
 
-def get_available_slots(conn, master_id: int, booking_date: str) -> List[str]:
+def bump_master_versions(conn, master_ids: List[int]) -> None:
+    """Увеличить версии доступности нескольких мастеров одним запросом"""
+    if not master_ids:
+        return
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO master_availability_versions (master_id, version)
+           SELECT unnest(%s::bigint[]), 1
+           ON CONFLICT (master_id) DO UPDATE
+           SET version = master_availability_versions.version + 1, updated_at = CURRENT_TIMESTAMP""",
+        (sorted(set(master_ids)),)
+    )
+
+@timed('slots')
+def get_cached_slots(conn, master_id: int, booking_date: str, duration: int) -> List[str]:
+    """Свободные слоты из кэша, если версия мастера не менялась, иначе расчёт и сохранение"""
+    version = get_master_version(conn, master_id)
+    cache_key = (master_id, booking_date, duration)
+    
+    slots = SLOT_CACHE.get(cache_key, version=version)
+    if slots is None:
+        slots = get_available_slots(conn, master_id, booking_date, duration)
+        SLOT_CACHE.set(cache_key, slots, version)
+    
+    return slots
+
+def resolve_duration(conn, params: Dict[str, Any]) -> int:
+    """Длительность услуги в минутах: явный duration или duration_minutes по service_id; ValueError для нечисловых"""
+    duration = int_param(params, 'duration')
+    if duration:
+        return duration
+    
+    service_id = int_param(params, 'service_id')
+    if service_id:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT duration_minutes FROM services WHERE id = %s",
+            (service_id,)
+        )
+        service = cursor.fetchone()
+        if service:
+            return service['duration_minutes']
+    
+    return SLOT_STEP_MINUTES
+
+def get_available_slots(conn, master_id: int, booking_date: str, duration: int = SLOT_STEP_MINUTES) -> List[str]:
     """Получить доступные временные слоты для мастера на дату"""
     cursor = conn.cursor()
     
     parsed_date = datetime.strptime(booking_date, '%Y-%m-%d').date()
     day_of_week = parsed_date.isoweekday()
     
-    cursor.execute(
-        """SELECT start_time, end_time FROM master_schedule 
-           WHERE master_id = %s AND day_of_week = %s AND is_active = true""",
-        (master_id, day_of_week)
-    )
+    SCHEDULE_FOR_DAY.execute(cursor, (master_id, day_of_week))
     schedule = cursor.fetchone()
     
     if not schedule:
         return []
     
+    BOOKED_INTERVALS.execute(cursor, (master_id, booking_date))
+    booked_slots = cursor.fetchall()
+    
+    return day_slots(schedule, booked_slots, duration)
+
+@timed('slots_range')
+def get_available_slots_range(conn, master_id: int, date_from: str, date_to: str,
+                              duration: int = SLOT_STEP_MINUTES) -> Dict[str, List[str]]:
+    """Получить доступные слоты мастера на каждый день диапазона двумя запросами"""
+    parsed_from, parsed_to = parse_date_range(date_from, date_to)
+    
+    cursor = conn.cursor()
     cursor.execute(
-        """SELECT start_time, end_time FROM bookings 
-           WHERE master_id = %s AND booking_date = %s AND status != %s""",
-        (master_id, booking_date, 'cancelled')
+        """SELECT day_of_week, start_time, end_time FROM master_schedule
+           WHERE master_id = %s AND is_active = true""",
+        (master_id,)
     )
-    booked_slots = cursor.fetchall()
+    schedules = cursor.fetchall()
     
-    all_slots = []
-    current = datetime.combine(parsed_date, schedule['start_time'])
-    end = datetime.combine(parsed_date, schedule['end_time'])
+    if not schedules:
+        return range_slots([], [], parsed_from, parsed_to, duration)
     
-    while current < end:
-        slot_time = current.strftime('%H:%M')
-        is_available = True
-        
-        for booked in booked_slots:
-            booked_start = datetime.combine(parsed_date, booked['start_time'])
-            booked_end = datetime.combine(parsed_date, booked['end_time'])
-            
-            if booked_start <= current < booked_end:
-                is_available = False
-                break
-        
-        if is_available:
-            all_slots.append(slot_time)
-        
-        current += timedelta(minutes=30)
+    cursor.execute(
+        """SELECT booking_date, start_time, end_time FROM bookings
+           WHERE master_id = %s AND booking_date BETWEEN %s AND %s AND status != %s""",
+        (master_id, parsed_from, parsed_to, 'cancelled')
+    )
+    booked = cursor.fetchall()
     
-    return all_slots
+    return range_slots(schedules, booked, parsed_from, parsed_to, duration)
+
+def nearest_alternatives(conn, master_id: int, booking_date: str, start_time: str,
+                         duration: int, count: int = 3) -> List[str]:
+    """Ближайшие к запрошенному времени свободные слоты того же дня"""
+    requested = to_minutes(datetime.strptime(start_time, '%H:%M').time())
+    slots = get_available_slots(conn, master_id, booking_date, duration)
+    slots.sort(key=lambda slot: (abs(to_minutes(datetime.strptime(slot, '%H:%M').time()) - requested), slot))
+    return sorted(slots[:count])
 
+@timed('earliest')
+def find_earliest_slots(conn, service_id: Optional[int], service_name: Optional[str],
+                        horizon_days: int, limit: int) -> List[Dict[str, Any]]:
+    """Ближайшие свободные слоты по всем мастерам, оказывающим услугу, одним запросом"""
+    now = datetime.now()
+    date_from = now.date()
+    # horizon_days дней, включая сегодняшний
+    date_to = date_from + timedelta(days=horizon_days - 1)
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        """WITH offers AS (
+               SELECT DISTINCT ON (s.master_id)
+                      s.master_id, s.id AS service_id, s.duration_minutes, m.first_name AS master_name
+               FROM services s
+               JOIN users m ON s.master_id = m.id
+               WHERE lower(s.name) = lower(COALESCE(%s, (SELECT name FROM services WHERE id = %s)))
+               ORDER BY s.master_id, s.duration_minutes
+           )
+           SELECT 'offer' AS kind, o.master_id, o.service_id, o.duration_minutes, o.master_name,
+                  NULL::int AS day_of_week, NULL::date AS booking_date,
+                  NULL::time AS start_time, NULL::time AS end_time
+           FROM offers o
+           UNION ALL
+           SELECT 'schedule', ms.master_id, NULL, NULL, NULL,
+                  ms.day_of_week, NULL, ms.start_time, ms.end_time
+           FROM master_schedule ms
+           WHERE ms.master_id IN (SELECT master_id FROM offers) AND ms.is_active = true
+           UNION ALL
+           SELECT 'booking', b.master_id, NULL, NULL, NULL,
+                  NULL, b.booking_date, b.start_time, b.end_time
+           FROM bookings b
+           WHERE b.master_id IN (SELECT master_id FROM offers)
+             AND b.booking_date BETWEEN %s AND %s AND b.status != %s""",
+        (service_name, service_id, date_from, date_to, 'cancelled')
+    )
+    rows = cursor.fetchall()
+    
+    offers = [r for r in rows if r['kind'] == 'offer']
+    schedules = [r for r in rows if r['kind'] == 'schedule']
+    booked = [r for r in rows if r['kind'] == 'booking']
+    
+    return earliest_slots(offers, schedules, booked, date_from, date_to, limit,
+                          not_before=now.hour * 60 + now.minute)
+
+def serialize_booking(b: Dict[str, Any]) -> Dict[str, Any]:
+    """Строка истории бронирований в формат ответа API"""
+    return {
+        'id': b['id'],
+        'date': b['booking_date'].isoformat(),
+        'time': b['start_time'].strftime('%H:%M'),
+        'endTime': b['end_time'].strftime('%H:%M'),
+        'status': b['status'],
+        'masterName': b['master_name'],
+        'serviceName': b['service_name'],
+        'price': float(b['price']),
+        'notes': b['notes']
+    }
+
+@timed('history')
+def get_bookings_page(conn, user_id: int, after: Optional[List[Any]],
+                      limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Страница истории бронирований клиента по ключу (booking_date, start_time, id)"""
+    cursor = conn.cursor()
+    if after:
+        HISTORY_NEXT_PAGE.execute(cursor, (user_id, *after, limit + 1))
+    else:
+        HISTORY_FIRST_PAGE.execute(cursor, (user_id, limit + 1))
+    bookings = cursor.fetchall()
+    
+    next_cursor = None
+    if len(bookings) > limit:
+        bookings = bookings[:limit]
+        last = bookings[-1]
+        next_cursor = encode_cursor([last['booking_date'].isoformat(), last['start_time'].isoformat(), last['id']])
+    
+    return [serialize_booking(b) for b in bookings], next_cursor
+
+def serialize_stats(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Строка агрегата за период в формат ответа API"""
+    scheduled = row['scheduled_minutes']
+    total = row['bookings_count']
+    return {
+        'scheduledMinutes': scheduled,
+        'bookedMinutes': row['booked_minutes'],
+        'occupancy': round(row['booked_minutes'] / scheduled, 4) if scheduled else None,
+        'bookings': total,
+        'cancelled': row['cancelled_count'],
+        'completed': row['completed_count'],
+        'cancellationRate': round(row['cancelled_count'] / total, 4) if total else None,
+        'bookedRevenue': float(row['booked_revenue']),
+        'revenue': float(row['completed_revenue'])
+    }
+
+@timed('stats')
+def get_master_stats(conn, master_id: int, date_from: str, date_to: str, group: str) -> Dict[str, Any]:
+    """
+    Загрузка и выручка мастера по дням или неделям из master_daily_stats; рабочие минуты считаются
+    по master_schedule для каждого дня диапазона, поэтому смена расписания не требует пересчёта агрегатов
+    """
+    parsed_from, parsed_to = parse_date_range(date_from, date_to, MAX_STATS_RANGE_DAYS)
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT date_trunc(%s, d)::date AS period,
+                  COALESCE(SUM(EXTRACT(EPOCH FROM ms.end_time - ms.start_time) / 60), 0)::int AS scheduled_minutes,
+                  COALESCE(SUM(st.booked_minutes), 0)::int AS booked_minutes,
+                  COALESCE(SUM(st.bookings_count), 0)::int AS bookings_count,
+                  COALESCE(SUM(st.cancelled_count), 0)::int AS cancelled_count,
+                  COALESCE(SUM(st.completed_count), 0)::int AS completed_count,
+                  COALESCE(SUM(st.booked_revenue), 0) AS booked_revenue,
+                  COALESCE(SUM(st.completed_revenue), 0) AS completed_revenue
+           FROM generate_series(%s::timestamp, %s::timestamp, interval '1 day') AS d
+           LEFT JOIN master_schedule ms
+             ON ms.master_id = %s AND ms.day_of_week = EXTRACT(ISODOW FROM d) AND ms.is_active = true
+           LEFT JOIN master_daily_stats st ON st.master_id = %s AND st.stat_date = d::date
+           GROUP BY 1
+           ORDER BY 1""",
+        (group, parsed_from, parsed_to, master_id, master_id)
+    )
+    rows = cursor.fetchall()
+    
+    totals = {key: sum(row[key] for row in rows) for key in (
+        'scheduled_minutes', 'booked_minutes', 'bookings_count', 'cancelled_count',
+        'completed_count', 'booked_revenue', 'completed_revenue'
+    )}
+    return {
+        'periods': [{'period': row['period'].isoformat(), **serialize_stats(row)} for row in rows],
+        'totals': serialize_stats(totals)
+    }
+
+@timed('cancel_batch')
+def cancel_bookings(conn, actor_id: int, booking_ids: Optional[List[int]] = None,
+                    master_id: Optional[int] = None, date_from: Optional[str] = None,
+                    date_to: Optional[str] = None) -> Dict[int, str]:
+    """
+    Отменить записи по списку id (клиента или мастера actor_id) либо все записи мастера за диапазон дат
+    одним UPDATE; клиентам отменённых чужими руками записей уходит уведомление одной пакетной вставкой
+    """
+    if booking_ids is not None:
+        target = "id = ANY(%s) AND (client_id = %s OR master_id = %s)"
+        params: Tuple[Any, ...] = (booking_ids, actor_id, actor_id)
+    else:
+        target = "master_id = %s AND booking_date BETWEEN %s AND %s"
+        params = (master_id, date_from, date_to)
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""WITH target AS (
+               SELECT id, status FROM bookings WHERE {target}
+               ORDER BY id
+               FOR UPDATE
+           ), cancelled AS (
+               UPDATE bookings b SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+               FROM target t
+               WHERE b.id = t.id AND t.status IN ('pending', 'confirmed')
+               RETURNING b.id, b.client_id, b.master_id, b.booking_date, b.start_time
+           )
+           SELECT t.id, t.status, c.client_id, c.master_id, c.booking_date, c.start_time,
+                  c.id IS NOT NULL AS is_cancelled
+           FROM target t LEFT JOIN cancelled c ON c.id = t.id
+           ORDER BY t.id""",
+        params
+    )
+    rows = cursor.fetchall()
+    
+    statuses: Dict[int, str] = {}
+    events = []
+    master_ids = []
+    changes = []
+    for row in rows:
+        if not row['is_cancelled']:
+            statuses[row['id']] = 'already_cancelled' if row['status'] == 'cancelled' else row['status']
+            continue
+        statuses[row['id']] = 'cancelled'
+        master_ids.append(row['master_id'])
+        changes.append((row['id'], row['status']))
+        if row['client_id'] != actor_id:
+            events.append((
+                row['client_id'], row['id'], 'booking_cancelled', 'Запись отменена',
+                f"Ваша запись на {row['booking_date'].isoformat()} в {row['start_time'].strftime('%H:%M')} отменена"
+            ))
+    
+    enqueue_notifications(conn, events)
+    bump_master_versions(conn, master_ids)
+    record_booking_changes(conn, changes)
+    return statuses
+
+PREFLIGHT_RESPONSE = preflight_response(
+    'GET, POST, PUT, DELETE, OPTIONS',
+    'Content-Type, X-User-Id, X-Telegram-User, X-Read-Primary, Idempotency-Key'
+)
+
+@instrument
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Telegram-User',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return PREFLIGHT_RESPONSE
     
     conn = None
     
     try:
-        conn = get_db_connection()
+        if method == 'GET':
+            conn = get_read_connection(request_telegram_id(event), wants_primary(event))
+        else:
+            mark_write(request_telegram_id(event))
+            conn = get_db_connection()
         
         if method == 'GET':
             params = event.get('queryStringParameters', {}) or {}
             action = params.get('action', 'list')
             
             if action == 'slots':
-                master_id = int(params.get('master_id', 0))
                 booking_date = params.get('date', '')
                 
-                slots = get_available_slots(conn, master_id, booking_date)
+                try:
+                    master_id = int_param(params, 'master_id', 0)
+                    duration = resolve_duration(conn, params)
+                    slots = get_cached_slots(conn, master_id, booking_date, duration)
+                except ValueError as e:
+                    return error_response(400, str(e))
+                
+                return json_response({'slots': slots})
+            
+            if action == 'master_stats':
+                telegram_user = json.loads(event.get('headers', {}).get('X-Telegram-User', '{}'))
+                
+                if not telegram_user.get('id'):
+                    return error_response(401, 'Unauthorized')
+                
+                master_id = resolve_user_id(conn, telegram_user, create=False)
+                
+                if not master_id:
+                    return error_response(404, 'User not found')
+                
+                group = params.get('group', 'day')
+                if group not in ('day', 'week'):
+                    return error_response(400, 'group must be day or week')
+                
+                try:
+                    stats = get_master_stats(conn, master_id, params.get('from', ''), params.get('to', ''), group)
+                except ValueError as e:
+                    return error_response(400, str(e))
+                
+                return json_response(stats)
+            
+            if action == 'cache_stats':
+                return json_response({'slotCache': SLOT_CACHE.stats()})
+            
+            if action == 'slots_range':
+                date_from = params.get('from', '')
+                date_to = params.get('to', '')
+                
+                try:
+                    master_id = int_param(params, 'master_id', 0)
+                    duration = resolve_duration(conn, params)
+                    days = get_available_slots_range(conn, master_id, date_from, date_to, duration)
+                except ValueError as e:
+                    return error_response(400, str(e))
+                
+                return json_response({'days': days})
+            
+            if action == 'earliest':
+                service_name = params.get('service') or None
+                
+                try:
+                    service_id = int_param(params, 'service_id')
+                    horizon_days = min(max(int_param(params, 'days', 14), 1), MAX_RANGE_DAYS)
+                    limit = min(max(int_param(params, 'limit', 5), 1), 50)
+                except ValueError as e:
+                    return error_response(400, str(e))
+                
+                if not service_id and not service_name:
+                    return error_response(400, 'service_id or service is required')
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'slots': slots})
-                }
+                slots = find_earliest_slots(conn, service_id, service_name, horizon_days, limit)
+                
+                return json_response({'slots': slots})
             
             telegram_user_header = event.get('headers', {}).get('X-Telegram-User', '{}')
             telegram_user = json.loads(telegram_user_header)
             
             if not telegram_user.get('id'):
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Unauthorized'})
-                }
+                return error_response(401, 'Unauthorized')
             
-            user_id = get_or_create_user(conn, telegram_user)
+            user_id = resolve_user_id(conn, telegram_user)
+            conn = reroute_if_written(conn, telegram_user['id'])
             
-            cursor = conn.cursor()
-            cursor.execute(
-                """SELECT b.id, b.booking_date, b.start_time, b.end_time, b.status, b.notes,
-                          m.first_name as master_name, s.name as service_name, s.price
-                   FROM bookings b
-                   JOIN users m ON b.master_id = m.id
-                   JOIN services s ON b.service_id = s.id
-                   WHERE b.client_id = %s
-                   ORDER BY b.booking_date DESC, b.start_time DESC
-                   LIMIT 50""",
-                (user_id,)
-            )
-            bookings = cursor.fetchall()
+            try:
+                after = decode_cursor(params.get('cursor'), HISTORY_CURSOR_KEY)
+            except InvalidCursor as e:
+                return error_response(400, str(e))
             
-            bookings_list = []
-            for b in bookings:
-                bookings_list.append({
-                    'id': b['id'],
-                    'date': b['booking_date'].isoformat(),
-                    'time': b['start_time'].strftime('%H:%M'),
-                    'endTime': b['end_time'].strftime('%H:%M'),
-                    'status': b['status'],
-                    'masterName': b['master_name'],
-                    'serviceName': b['service_name'],
-                    'price': float(b['price']),
-                    'notes': b['notes']
-                })
+            bookings_list, next_cursor = get_bookings_page(conn, user_id, after, parse_limit(params))
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'bookings': bookings_list})
-            }
+            return json_response({'bookings': bookings_list, 'nextCursor': next_cursor})
         
         if method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
             telegram_user = body_data.get('telegramUser', {})
             
             if not telegram_user.get('id'):
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Unauthorized'})
-                }
+                return error_response(401, 'Unauthorized')
+            
+            try:
+                key = idempotency_key(event)
+            except ValueError as e:
+                return error_response(400, str(e))
             
-            user_id = get_or_create_user(conn, telegram_user)
+            user_id = resolve_user_id(conn, telegram_user)
             
             master_id = body_data.get('masterId')
             service_id = body_data.get('serviceId')
@@ -203,69 +508,147 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             end_datetime = datetime.combine(date.today(), parsed_time) + timedelta(minutes=duration)
             end_time = end_datetime.time()
             
+            if end_datetime.date() != date.today():
+                return error_response(400, 'Booking must end on the same day')
+            
+            if key:
+                fingerprint = request_fingerprint({field: body_data.get(field) for field in BOOKING_FINGERPRINT_FIELDS})
+                try:
+                    claimed, existing_booking_id = claim_key(conn, user_id, key, fingerprint)
+                except IdempotencyConflict as e:
+                    conn.rollback()
+                    return error_response(422, str(e))
+                if not claimed:
+                    conn.rollback()
+                    return json_response({'success': True, 'bookingId': existing_booking_id},
+                                         headers=REPLAYED_HEADERS)
+            
             cursor = conn.cursor()
-            cursor.execute(
-                """INSERT INTO bookings 
-                   (client_id, master_id, service_id, booking_date, start_time, end_time, status, notes)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                   RETURNING id""",
-                (user_id, master_id, service_id, booking_date, start_time, end_time, 'pending', notes)
-            )
+            try:
+                cursor.execute(
+                    """INSERT INTO bookings 
+                       (client_id, master_id, service_id, booking_date, start_time, end_time, status, notes)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                       RETURNING id""",
+                    (user_id, master_id, service_id, booking_date, start_time, end_time, 'pending', notes)
+                )
+            except Exception as e:
+                if getattr(e, 'pgcode', None) != EXCLUSION_VIOLATION:
+                    raise
+                conn.rollback()
+                alternatives = nearest_alternatives(conn, master_id, booking_date, start_time, duration)
+                return json_response({'error': 'Slot is already booked', 'alternatives': alternatives}, 409)
             booking_id = cursor.fetchone()['id']
             
-            cursor.execute(
-                """INSERT INTO notifications (user_id, booking_id, type, title, message)
-                   VALUES (%s, %s, %s, %s, %s)""",
-                (user_id, booking_id, 'booking_created', 'Запись создана',
-                 f'Ваша запись на {booking_date} в {start_time} успешно создана')
-            )
+            if key:
+                complete_key(conn, user_id, key, booking_id)
+            
+            enqueue_notification(conn, user_id, booking_id, 'booking_created', 'Запись создана',
+                                 f'Ваша запись на {booking_date} в {start_time} успешно создана')
             
+            increment_bookings_count(conn, user_id)
+            record_booking_changes(conn, [(booking_id, None)])
+            bump_master_version(conn, master_id)
             conn.commit()
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'success': True, 'bookingId': booking_id})
-            }
+            return json_response({'success': True, 'bookingId': booking_id})
         
         if method == 'PUT':
             body_data = json.loads(event.get('body', '{}'))
             booking_id = body_data.get('bookingId')
             action = body_data.get('action')
             
+            if action == 'cancel' and ('bookingIds' in body_data or 'from' in body_data or 'masterId' in body_data):
+                telegram_user = json.loads(event.get('headers', {}).get('X-Telegram-User', '{}'))
+                
+                if not telegram_user.get('id'):
+                    return error_response(401, 'Unauthorized')
+                
+                user_id = resolve_user_id(conn, telegram_user, create=False)
+                
+                if not user_id:
+                    return error_response(404, 'User not found')
+                
+                if 'bookingIds' in body_data:
+                    try:
+                        booking_ids = parse_ids(body_data['bookingIds'])
+                    except InvalidBatch as e:
+                        return error_response(400, str(e))
+                    
+                    statuses = cancel_bookings(conn, user_id, booking_ids=booking_ids)
+                    results = batch_results(booking_ids, statuses)
+                else:
+                    # Мастер - сам вызывающий; masterId из тела только сверяется с ним
+                    if body_data.get('masterId', user_id) != user_id or not is_master(conn, user_id):
+                        return error_response(403, 'Only the master can cancel their own schedule')
+                    
+                    try:
+                        date_from, date_to = parse_date_range(body_data.get('from', ''),
+                                                              body_data.get('to') or body_data.get('from', ''))
+                    except ValueError as e:
+                        return error_response(400, str(e))
+                    
+                    statuses = cancel_bookings(conn, user_id, master_id=user_id,
+                                               date_from=date_from.isoformat(), date_to=date_to.isoformat())
+                    results = batch_results(list(statuses), statuses)
+                
+                conn.commit()
+                
+                return json_response({
+                    'success': True,
+                    'cancelled': sum(1 for item in results if item['status'] == 'cancelled'),
+                    'results': results
+                })
+            
             if action == 'cancel':
                 cursor = conn.cursor()
                 cursor.execute(
-                    "UPDATE bookings SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
-                    ('cancelled', booking_id)
+                    """WITH previous AS (SELECT id, status FROM bookings WHERE id = %s FOR UPDATE)
+                       UPDATE bookings b SET status = %s, updated_at = CURRENT_TIMESTAMP
+                       FROM previous p WHERE b.id = p.id
+                       RETURNING b.master_id, p.status AS previous_status""",
+                    (booking_id, 'cancelled')
+                )
+                cancelled = cursor.fetchone()
+                if cancelled:
+                    bump_master_version(conn, cancelled['master_id'])
+                    record_booking_changes(conn, [(booking_id, cancelled['previous_status'])])
+                conn.commit()
+                
+                return json_response({'success': True})
+            
+            if action == 'complete':
+                telegram_user = json.loads(event.get('headers', {}).get('X-Telegram-User', '{}'))
+                
+                if not telegram_user.get('id'):
+                    return error_response(401, 'Unauthorized')
+                
+                user_id = resolve_user_id(conn, telegram_user, create=False)
+                
+                cursor = conn.cursor()
+                cursor.execute(
+                    """WITH previous AS (
+                           SELECT id, status FROM bookings WHERE id = %s AND master_id = %s FOR UPDATE
+                       )
+                       UPDATE bookings b SET status = 'completed', updated_at = CURRENT_TIMESTAMP
+                       FROM previous p WHERE b.id = p.id AND p.status IN ('pending', 'confirmed')
+                       RETURNING p.status AS previous_status""",
+                    (booking_id, user_id)
                 )
+                completed = cursor.fetchone()
+                if not completed:
+                    conn.rollback()
+                    return error_response(404, 'No pending booking with this id for the master')
+                record_booking_changes(conn, [(booking_id, completed['previous_status'])])
                 conn.commit()
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'success': True})
-                }
+                return json_response({'success': True})
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return error_response(405, 'Method not allowed')
     
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+        return error_response(500, str(e))
     
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
@@ -0,0 +1,4 @@
+'''
+Фоновые задачи backend: воркер уведомлений, напоминания, обслуживание секций и пересчёты.
+Запускаются как модули из каталога backend, например: python -m jobs.notification_worker --once
+'''
@@ -0,0 +1,50 @@
+'''
+Business: Пересчёт агрегатов master_daily_stats по bookings - после сбоя, ручной правки данных или миграции
+Args: DATABASE_URL, --from/--to - диапазон дат (по умолчанию все даты записей), --days - дней в одной транзакции
+Returns: печатает число пересчитанных строк по пачкам и итог
+'''
+
+import argparse
+import time
+from datetime import date, timedelta
+
+from shared.db import get_db_connection, release_connection
+from shared.master_stats import booking_date_bounds, rebuild_master_stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--from', dest='date_from', type=date.fromisoformat)
+    parser.add_argument('--to', dest='date_to', type=date.fromisoformat)
+    parser.add_argument('--days', type=int, default=7,
+                        help='пачка держит блокировку агрегатов, новые записи ждут её commit')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        min_date, max_date = booking_date_bounds(conn)
+        conn.rollback()
+        date_from = args.date_from or min_date
+        date_to = args.date_to or max_date
+        if date_from is None or date_to is None:
+            print('no bookings, nothing to rebuild')
+            return
+
+        started = time.perf_counter()
+        rebuilt = 0
+        batch_from = date_from
+        while batch_from <= date_to:
+            batch_to = min(batch_from + timedelta(days=args.days - 1), date_to)
+            rows = rebuild_master_stats(conn, batch_from.isoformat(), batch_to.isoformat())
+            conn.commit()
+            rebuilt += rows
+            print(f'{batch_from}..{batch_to}: {rows} rows')
+            batch_from = batch_to + timedelta(days=1)
+
+        print(f'rebuilt {rebuilt} rows for {date_from}..{date_to} in {time.perf_counter() - started:.2f}s')
+    finally:
+        release_connection(conn)
+
+
+if __name__ == '__main__':
+    main()
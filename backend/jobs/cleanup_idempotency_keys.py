@@ -0,0 +1,36 @@
+'''
+Business: Удаление просроченных ключей идемпотентности создания записей
+Args: DATABASE_URL, --batch-size - сколько ключей удалять в одной транзакции
+Returns: печатает число удалённых ключей
+'''
+
+import argparse
+import time
+
+from shared.db import get_db_connection, release_connection
+from shared.idempotency import delete_expired_keys
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        started = time.perf_counter()
+        deleted = 0
+        while True:
+            count = delete_expired_keys(conn, args.batch_size)
+            conn.commit()
+            deleted += count
+            if count < args.batch_size:
+                break
+
+        print(f'deleted {deleted} expired idempotency keys in {time.perf_counter() - started:.2f}s')
+    finally:
+        release_connection(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+'''
+Business: Воркер outbox уведомлений - пачкой создаёт строки notifications и рассылает сообщения через Telegram Bot API
+Args: DATABASE_URL, TELEGRAM_BOT_TOKEN (без токена сообщения не отправляются), TELEGRAM_API_URL
+      --batch-size, --concurrency, --rate, --interval, --once
+Returns: на каждую пачку печатает JSON-строку с размером пачки, числом доставок и задержками
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.db import get_db_connection, release_connection
+
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '')
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+SEND_RETRIES = 3
+SEND_TIMEOUT = 10
+DEADLOCK_DETECTED = '40P01'
+DEADLOCK_RETRIES = 3
+ERROR_BACKOFF_BASE = 1.0
+ERROR_BACKOFF_MAX = 60.0
+
+
+def claim_batch(conn, batch_size: int) -> List[Dict[str, Any]]:
+    """Забрать пачку ожидающих событий; параллельные воркеры пропускают чужие строки"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """UPDATE notification_outbox o
+           SET attempts = o.attempts + 1,
+               next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+           FROM users u
+           WHERE u.id = o.user_id AND o.id IN (
+               SELECT id FROM notification_outbox
+               WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+               ORDER BY next_attempt_at, id
+               LIMIT %s
+               FOR UPDATE SKIP LOCKED
+           )
+           RETURNING o.id, o.title, o.message, o.attempts, o.notification_id, u.telegram_id,
+                     EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - o.created_at) AS queued_seconds""",
+        (LEASE_SECONDS, batch_size)
+    )
+    rows = cursor.fetchall()
+    conn.commit()
+    return rows
+
+
+def materialize_notifications(conn, outbox_ids: List[int]) -> int:
+    """Одним запросом создать notifications для событий без них, обновить счётчики и связать с outbox
+
+    Строки users получателей блокируются заранее в порядке id - так же, как их блокирует repair_counters,
+    поэтому пачки не взаимоблокируются друг с другом и с пересчётом; на deadlock с транзакцией
+    обработчика пачка откатывается и повторяется.
+    """
+    import psycopg2
+
+    if not outbox_ids:
+        return 0
+    for attempt in range(DEADLOCK_RETRIES):
+        try:
+            return _materialize(conn, outbox_ids)
+        except psycopg2.Error as e:
+            conn.rollback()
+            if e.pgcode != DEADLOCK_DETECTED or attempt == DEADLOCK_RETRIES - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+    return 0
+
+
+def _materialize(conn, outbox_ids: List[int]) -> int:
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT id FROM users
+           WHERE id IN (SELECT user_id FROM notification_outbox WHERE id = ANY(%s) AND notification_id IS NULL)
+           ORDER BY id
+           FOR UPDATE""",
+        (outbox_ids,)
+    )
+    cursor.execute(
+        """WITH src AS (
+               SELECT id AS outbox_id, nextval(pg_get_serial_sequence('notifications', 'id')) AS notification_id,
+                      user_id, booking_id, type, title, message, created_at
+               FROM notification_outbox
+               WHERE id = ANY(%s) AND notification_id IS NULL
+           ),
+           inserted AS (
+               INSERT INTO notifications (id, user_id, booking_id, type, title, message, created_at)
+               SELECT notification_id, user_id, booking_id, type, title, message, created_at FROM src
+           ),
+           counters AS (
+               UPDATE users u SET unread_notifications_count = u.unread_notifications_count + c.count,
+                                  notifications_version = u.notifications_version + 1
+               FROM (SELECT user_id, COUNT(*) AS count FROM src GROUP BY user_id) c
+               WHERE u.id = c.user_id
+           )
+           UPDATE notification_outbox o SET notification_id = src.notification_id
+           FROM src WHERE o.id = src.outbox_id""",
+        (outbox_ids,)
+    )
+    created = cursor.rowcount
+    conn.commit()
+    return created
+
+
+def finish_events(conn, delivered: List[int], failures: List[Tuple[int, str, bool]]) -> None:
+    """Отметить доставленные события; неудачные перенести с экспоненциальной задержкой или закрыть"""
+    cursor = conn.cursor()
+    if delivered:
+        cursor.execute(
+            """UPDATE notification_outbox
+               SET status = 'delivered', processed_at = CURRENT_TIMESTAMP, last_error = NULL
+               WHERE id = ANY(%s)""",
+            (delivered,)
+        )
+    if failures:
+        ids, errors, permanent = zip(*failures)
+        cursor.execute(
+            """UPDATE notification_outbox o
+               SET status = CASE WHEN f.permanent OR o.attempts >= %s THEN 'failed' ELSE 'pending' END,
+                   processed_at = CASE WHEN f.permanent OR o.attempts >= %s THEN CURRENT_TIMESTAMP END,
+                   next_attempt_at = CURRENT_TIMESTAMP
+                       + make_interval(secs => LEAST(%s * power(2, o.attempts - 1), %s)),
+                   last_error = f.error
+               FROM unnest(%s::bigint[], %s::text[], %s::boolean[]) AS f(id, error, permanent)
+               WHERE o.id = f.id""",
+            (MAX_ATTEMPTS, MAX_ATTEMPTS, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS,
+             list(ids), list(errors), list(permanent))
+        )
+    conn.commit()
+
+
+class RateLimiter:
+    """Token bucket: не больше rate отправок в секунду на процесс; один на процесс, живёт между пачками"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self) -> None:
+        if self.lock is None:
+            # Создаётся в цикле событий, где используется, а не при конструировании
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def post_send_message(chat_id: int, text: str) -> Tuple[int, Dict[str, Any]]:
+    """Синхронный вызов sendMessage; выполняется в пуле потоков event loop"""
+    url = f'{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
+    data = json.dumps({'chat_id': chat_id, 'text': text}).encode()
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=SEND_TIMEOUT) as response:
+            return response.status, json.loads(response.read() or b'{}')
+    except urllib.error.HTTPError as e:
+        try:
+            payload = json.loads(e.read() or b'{}')
+        except ValueError:
+            payload = {}
+        return e.code, payload
+
+
+async def send_message(row: Dict[str, Any], limiter: RateLimiter,
+                       semaphore: asyncio.Semaphore) -> Tuple[bool, Optional[str], bool, float]:
+    """Отправить одно сообщение с повторами: (успех, ошибка, ошибка постоянная, длительность)"""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    text = f"{row['title']}\n{row['message']}"
+    error = None
+
+    async with semaphore:
+        for attempt in range(SEND_RETRIES):
+            await limiter.acquire()
+            try:
+                status, payload = await loop.run_in_executor(None, post_send_message, row['telegram_id'], text)
+            except (urllib.error.URLError, OSError) as e:
+                status, payload = 0, {'description': str(e)}
+
+            if status == 200 and payload.get('ok'):
+                return True, None, False, time.perf_counter() - started
+
+            error = f"{status}: {payload.get('description', 'request failed')}"
+            if status in (400, 403, 404):
+                return False, error, True, time.perf_counter() - started
+
+            retry_after = (payload.get('parameters') or {}).get('retry_after')
+            await asyncio.sleep(retry_after if status == 429 and retry_after else 0.5 * 2 ** attempt)
+
+    return False, error, False, time.perf_counter() - started
+
+
+async def deliver(rows: List[Dict[str, Any]], concurrency: int,
+                  limiter: RateLimiter) -> List[Tuple[bool, Optional[str], bool, float]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(send_message(row, limiter, semaphore) for row in rows))
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+
+def run_once(conn, batch_size: int, concurrency: int, limiter: RateLimiter,
+             loop: asyncio.AbstractEventLoop) -> Dict[str, Any]:
+    """Обработать одну пачку событий в долгоживущем цикле loop и вернуть метрики"""
+    started = time.perf_counter()
+    rows = claim_batch(conn, batch_size)
+    created = materialize_notifications(conn, [r['id'] for r in rows])
+
+    delivered: List[int] = []
+    failures: List[Tuple[int, str, bool]] = []
+    send_latencies: List[float] = []
+    end_to_end: List[float] = []
+
+    if rows and TELEGRAM_BOT_TOKEN:
+        results = loop.run_until_complete(deliver(rows, concurrency, limiter))
+        elapsed = time.perf_counter() - started
+        for row, (ok, error, permanent, latency) in zip(rows, results):
+            send_latencies.append(latency)
+            if ok:
+                delivered.append(row['id'])
+                end_to_end.append(float(row['queued_seconds']) + elapsed)
+            else:
+                failures.append((row['id'], error, permanent))
+    else:
+        delivered = [r['id'] for r in rows]
+
+    finish_events(conn, delivered, failures)
+
+    return {
+        'batchSize': len(rows),
+        'notificationsCreated': created,
+        'delivered': len(delivered),
+        'failed': len(failures),
+        'sendP50': percentile(send_latencies, 0.5),
+        'sendP95': percentile(send_latencies, 0.95),
+        'deliveryP50': percentile(end_to_end, 0.5),
+        'deliveryP95': percentile(end_to_end, 0.95),
+        'batchSeconds': round(time.perf_counter() - started, 4)
+    }
+
+
+def recover_connection(conn, error: Exception):
+    """После сбоя итерации откатить транзакцию; потерянное подключение закрыть и вернуть None для переподключения"""
+    import psycopg2
+
+    if conn is None:
+        return None
+    if not isinstance(error, psycopg2.OperationalError) and not conn.closed:
+        try:
+            conn.rollback()
+            return conn
+        except psycopg2.Error:
+            pass
+    conn.close()
+    release_connection(conn)
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=25.0, help='сообщений в секунду (лимит Bot API ~30)')
+    parser.add_argument('--interval', type=float, default=2.0, help='пауза, когда очередь пуста')
+    parser.add_argument('--once', action='store_true', help='обработать одну пачку и выйти')
+    args = parser.parse_args()
+
+    # Лимитер и цикл событий общие для всех пачек: ведро токенов не наполняется заново на каждой пачке
+    limiter = RateLimiter(args.rate)
+    loop = asyncio.new_event_loop()
+    conn = None
+    errors = 0
+    try:
+        while True:
+            try:
+                if conn is None:
+                    conn = get_db_connection()
+                metrics = run_once(conn, args.batch_size, args.concurrency, limiter, loop)
+                errors = 0
+            except Exception as e:
+                if args.once:
+                    raise
+                errors += 1
+                print(json.dumps({'error': f'{type(e).__name__}: {e}', 'consecutiveErrors': errors}),
+                      file=sys.stderr, flush=True)
+                conn = recover_connection(conn, e)
+                time.sleep(min(ERROR_BACKOFF_BASE * 2 ** (errors - 1), ERROR_BACKOFF_MAX))
+                continue
+            if metrics['batchSize'] or args.once:
+                print(json.dumps(metrics), flush=True)
+            if args.once:
+                break
+            if metrics['batchSize'] < args.batch_size:
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if conn is not None:
+            release_connection(conn)
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+'''
+Business: Обслуживание месячных секций - создание секций наперёд и отключение старых секций уведомлений
+Args: DATABASE_URL, --months-ahead - на сколько месяцев вперёд создавать секции,
+      --retention-months (NOTIFICATIONS_RETENTION_MONTHS) - сколько полных месяцев уведомлений хранить,
+      --archive-dir - выгрузить отключённую секцию в CSV.gz и удалить её вместо переноса в схему archive
+Returns: печатает созданные и отключённые секции
+'''
+
+import argparse
+import gzip
+import os
+import re
+from datetime import date
+from typing import List, Optional, Tuple
+
+from shared.db import get_db_connection, release_connection
+
+# Секционированная таблица и колонка ключа
+PARTITIONED_TABLES = [('bookings', 'booking_date'), ('notifications', 'created_at')]
+
+PARTITION_NAME = re.compile(r'^notifications_(\d{4})_(\d{2})$')
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_partitions(conn, months_ahead: int) -> List[str]:
+    """Создать недостающие секции с текущего месяца на months_ahead вперёд; вернуть имена новых"""
+    cursor = conn.cursor()
+    current = date.today().replace(day=1)
+    created = []
+    for parent, key_column in PARTITIONED_TABLES:
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            cursor.execute("SELECT to_regclass(%s) IS NULL AS missing",
+                           (f"{parent}_{month.strftime('%Y_%m')}",))
+            if not cursor.fetchone()['missing']:
+                continue
+            cursor.execute("SELECT create_month_partition(%s, %s, %s) AS name", (parent, key_column, month))
+            created.append(cursor.fetchone()['name'])
+            conn.commit()
+    conn.rollback()
+    return created
+
+
+def expired_notification_partitions(conn, retention_months: int) -> List[Tuple[str, date]]:
+    """Месячные секции notifications, целиком старше retention_months полных месяцев"""
+    cutoff = add_months(date.today().replace(day=1), -retention_months)
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT c.relname FROM pg_inherits i
+           JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = 'notifications'::regclass"""
+    )
+    expired = []
+    for row in cursor.fetchall():
+        match = PARTITION_NAME.match(row['relname'])
+        if match:
+            month = date(int(match.group(1)), int(match.group(2)), 1)
+            if add_months(month, 1) <= cutoff:
+                expired.append((row['relname'], month))
+    conn.rollback()
+    return sorted(expired, key=lambda item: item[1])
+
+
+def detach_partition(conn, name: str, archive_dir: Optional[str] = None) -> int:
+    """
+    Отключить секцию уведомлений; непрочитанные уведомления в ней вычитаются из счётчиков пользователей
+    в той же транзакции. Секция переносится в схему archive или выгружается в archive_dir и удаляется
+    """
+    cursor = conn.cursor()
+    cursor.execute("SET LOCAL lock_timeout = '5s'")
+    # Отметки прочитанными в этой секции ждут commit, иначе вычтенное число непрочитанных устареет
+    cursor.execute(f"LOCK TABLE {name} IN EXCLUSIVE MODE")
+    cursor.execute(
+        f"""UPDATE users u
+            SET unread_notifications_count = GREATEST(u.unread_notifications_count - c.unread, 0),
+                notifications_version = u.notifications_version + 1
+            FROM (SELECT user_id, COUNT(*) AS unread FROM {name}
+                  WHERE is_read = false GROUP BY user_id) c
+            WHERE u.id = c.user_id"""
+    )
+    affected_users = cursor.rowcount
+    cursor.execute(f"ALTER TABLE notifications DETACH PARTITION {name}")
+
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+        with gzip.open(os.path.join(archive_dir, f'{name}.csv.gz'), 'wt') as f:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+        cursor.execute(f"DROP TABLE {name}")
+    else:
+        cursor.execute(f"ALTER TABLE {name} SET SCHEMA archive")
+
+    conn.commit()
+    return affected_users
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--months-ahead', type=int, default=3)
+    parser.add_argument('--retention-months', type=int,
+                        default=int(os.environ.get('NOTIFICATIONS_RETENTION_MONTHS', '12')))
+    parser.add_argument('--archive-dir')
+    parser.add_argument('--dry-run', action='store_true', help='только показать секции к отключению')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        for name in ensure_partitions(conn, args.months_ahead):
+            print(f'created {name}')
+
+        for name, _ in expired_notification_partitions(conn, args.retention_months):
+            if args.dry_run:
+                print(f'would detach {name}')
+                continue
+            affected_users = detach_partition(conn, name, args.archive_dir)
+            destination = args.archive_dir or 'schema archive'
+            print(f'detached {name} to {destination}, unread counters adjusted for {affected_users} users')
+    finally:
+        release_connection(conn)
+
+
+if __name__ == '__main__':
+    main()
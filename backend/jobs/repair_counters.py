@@ -0,0 +1,39 @@
+'''
+Business: Пересчёт разошедшихся счётчиков users.bookings_count и users.unread_notifications_count
+Args: DATABASE_URL, --batch-size - сколько id пользователей пересчитывать в одной транзакции
+Returns: печатает число исправленных строк по пачкам и итог
+'''
+
+import argparse
+import time
+
+from shared.db import get_db_connection, release_connection
+from shared.counters import max_user_id, repair_counters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        last_id = max_user_id(conn) or 0
+        conn.rollback()
+
+        started = time.perf_counter()
+        repaired = 0
+        for id_from in range(1, last_id + 1, args.batch_size):
+            fixed = repair_counters(conn, id_from, id_from + args.batch_size)
+            conn.commit()
+            repaired += len(fixed)
+            if fixed:
+                print(f'users {id_from}..{id_from + args.batch_size - 1}: repaired {len(fixed)}')
+
+        print(f'repaired {repaired} users up to id {last_id} in {time.perf_counter() - started:.2f}s')
+    finally:
+        release_connection(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+'''
+Business: Планировщик напоминаний о записях - раз в интервал ставит в outbox все наступившие напоминания
+Args: DATABASE_URL, --day-hours, --soon-hours - за сколько часов до начала напоминать,
+      --interval - пауза между запусками, --once - один запуск и выход
+Returns: на каждый запуск печатает JSON-строку с числом найденных записей, поставленных напоминаний и временем
+'''
+
+import argparse
+import json
+import time
+
+from shared.db import get_db_connection, release_connection
+from shared.reminders import schedule_reminders
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--day-hours', type=float, default=24)
+    parser.add_argument('--soon-hours', type=float, default=2)
+    parser.add_argument('--interval', type=float, default=60.0)
+    parser.add_argument('--once', action='store_true', help='один запуск и выход')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        while True:
+            started = time.perf_counter()
+            counts = schedule_reminders(conn, args.day_hours, args.soon_hours)
+            conn.commit()
+            print(json.dumps({
+                **counts,
+                'inserted': sum(value for key, value in counts.items() if key != 'due'),
+                'ms': round((time.perf_counter() - started) * 1000, 2)
+            }), flush=True)
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        release_connection(conn)
+
+
+if __name__ == '__main__':
+    main()
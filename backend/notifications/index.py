@@ -7,117 +7,234 @@ Returns: HTTP response dict с уведомлениями
 
 import json
 import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import sys
+import zlib
+from typing import Dict, Any, Optional, List, Tuple
 
-def get_db_connection():
-    """Создание подключения к базе данных"""
-    database_url = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
 
+from shared.db import get_db_connection, get_read_connection, mark_write, release_connection
+from shared.http import error_response, json_response, preflight_response, request_telegram_id, wants_primary
+from shared.timing import instrument, timed
+from shared.users import resolve_user_id
+from shared.counters import adjust_unread_count
+from shared.pagination import InvalidCursor, decode_cursor, encode_cursor, parse_limit
+from shared.prepared import prepare
+from shared.batch import InvalidBatch, batch_results, parse_ids
+
+FEED_STATE = prepare('notifications_feed_state', """
+    SELECT unread_notifications_count, notifications_version FROM users WHERE id = %s""")
+
+FEED_QUERY = """
+    SELECT id, type, title, message, is_read, created_at
+    FROM notifications
+    WHERE user_id = %s {keyset}
+    ORDER BY created_at DESC, id DESC
+    LIMIT %s"""
+
+# Ключ сортировки ленты в курсоре: created_at, id
+FEED_CURSOR_KEY = ('timestamp', 'int')
+
+FEED_FIRST_PAGE = prepare('notifications_feed_first', FEED_QUERY.format(keyset=''))
+FEED_NEXT_PAGE = prepare('notifications_feed_after', FEED_QUERY.format(
+    keyset='AND (created_at, id) < (%s::timestamp, %s)'
+))
+
+NEW_SINCE = prepare('notifications_new_since', """
+    SELECT id, type, title, message, is_read, created_at
+    FROM notifications
+    WHERE user_id = %s AND id > %s
+    ORDER BY id
+    LIMIT %s""")
+
+def serialize_notification(n: Dict[str, Any]) -> Dict[str, Any]:
+    """Строка notifications в формат ответа API"""
+    return {
+        'id': n['id'],
+        'type': n['type'],
+        'title': n['title'],
+        'message': n['message'],
+        'isRead': n['is_read'],
+        'createdAt': n['created_at'].isoformat()
+    }
+
+@timed('list')
+def get_notifications_page(conn, user_id: int, after: Optional[List[Any]],
+                           limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Страница уведомлений пользователя по ключу (created_at, id)"""
+    cursor = conn.cursor()
+    if after:
+        FEED_NEXT_PAGE.execute(cursor, (user_id, *after, limit + 1))
+    else:
+        FEED_FIRST_PAGE.execute(cursor, (user_id, limit + 1))
+    notifications = cursor.fetchall()
+    
+    next_cursor = None
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        last = notifications[-1]
+        next_cursor = encode_cursor([last['created_at'].isoformat(), last['id']])
+    
+    return [serialize_notification(n) for n in notifications], next_cursor
+
+@timed('list')
+def get_new_notifications(conn, user_id: int, since_id: int,
+                          limit: int) -> Tuple[List[Dict[str, Any]], int, bool]:
+    """Уведомления с id больше since_id по возрастанию id, следующий since_id и признак, что остались ещё"""
+    cursor = conn.cursor()
+    NEW_SINCE.execute(cursor, (user_id, since_id, limit + 1))
+    notifications = cursor.fetchall()
+    
+    has_more = len(notifications) > limit
+    notifications = notifications[:limit]
+    next_since_id = notifications[-1]['id'] if notifications else since_id
+    
+    return [serialize_notification(n) for n in notifications], next_since_id, has_more
+
+def make_etag(user_id: int, version: int, params: Dict[str, Any]) -> str:
+    """ETag ленты: версия уведомлений пользователя плюс параметры запроса, от которых зависит ответ"""
+    variant = zlib.crc32(json.dumps(params, sort_keys=True).encode())
+    return f'"{user_id}-{version}-{variant:x}"'
+
+CACHE_HEADERS = {
+    'Access-Control-Expose-Headers': 'ETag',
+    'Cache-Control': 'private, no-cache',
+    'Vary': 'X-Telegram-User'
+}
+
+@timed('mark_batch')
+def mark_read_batch(conn, user_id: int, notification_ids: List[int]) -> Dict[int, str]:
+    """Отметить прочитанными уведомления пользователя из списка одним UPDATE; вернуть статус по каждому id"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """WITH target AS (
+               SELECT id, is_read FROM notifications
+               WHERE id = ANY(%s) AND user_id = %s
+               ORDER BY id
+               FOR UPDATE
+           ), updated AS (
+               UPDATE notifications n SET is_read = true
+               FROM target t
+               WHERE n.id = t.id AND t.is_read = false
+               RETURNING n.id
+           )
+           SELECT t.id, u.id IS NOT NULL AS is_updated
+           FROM target t LEFT JOIN updated u ON u.id = t.id""",
+        (notification_ids, user_id)
+    )
+    statuses = {row['id']: 'read' if row['is_updated'] else 'already_read' for row in cursor.fetchall()}
+    adjust_unread_count(conn, user_id, -sum(1 for status in statuses.values() if status == 'read'))
+    return statuses
+
+PREFLIGHT_RESPONSE = preflight_response(
+    'GET, POST, PUT, OPTIONS',
+    'Content-Type, X-Telegram-User, If-None-Match, X-Read-Primary'
+)
+
+@instrument
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Telegram-User',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return PREFLIGHT_RESPONSE
     
     conn = None
     
     try:
-        conn = get_db_connection()
+        if method == 'GET':
+            conn = get_read_connection(request_telegram_id(event), wants_primary(event))
+        else:
+            mark_write(request_telegram_id(event))
+            conn = get_db_connection()
         telegram_user_header = event.get('headers', {}).get('X-Telegram-User', '{}')
         telegram_user = json.loads(telegram_user_header)
         
         if not telegram_user.get('id'):
-            return {
-                'statusCode': 401,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Unauthorized'})
-            }
+            return error_response(401, 'Unauthorized')
         
-        telegram_id = telegram_user.get('id')
         cursor = conn.cursor()
         
-        cursor.execute("SELECT id FROM users WHERE telegram_id = %s", (telegram_id,))
-        user_result = cursor.fetchone()
-        
-        if not user_result:
-            return {
-                'statusCode': 404,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'User not found'})
-            }
+        user_id = resolve_user_id(conn, telegram_user, create=False)
         
-        user_id = user_result['id']
+        if not user_id:
+            return error_response(404, 'User not found')
         
         if method == 'GET':
-            cursor.execute(
-                """SELECT id, type, title, message, is_read, created_at
-                   FROM notifications
-                   WHERE user_id = %s
-                   ORDER BY created_at DESC
-                   LIMIT 50""",
-                (user_id,)
-            )
-            notifications = cursor.fetchall()
+            params = event.get('queryStringParameters', {}) or {}
             
-            notifications_list = []
-            for n in notifications:
-                notifications_list.append({
-                    'id': n['id'],
-                    'type': n['type'],
-                    'title': n['title'],
-                    'message': n['message'],
-                    'isRead': n['is_read'],
-                    'createdAt': n['created_at'].isoformat()
-                })
+            try:
+                after = decode_cursor(params.get('cursor'), FEED_CURSOR_KEY)
+                since_id = int(params['since_id']) if params.get('since_id') else None
+            except (InvalidCursor, ValueError) as e:
+                return error_response(400, str(e))
             
-            cursor.execute(
-                "SELECT COUNT(*) as count FROM notifications WHERE user_id = %s AND is_read = false",
-                (user_id,)
-            )
-            unread_count = cursor.fetchone()['count']
+            FEED_STATE.execute(cursor, (user_id,))
+            feed = cursor.fetchone()
+            unread_count = feed['unread_notifications_count']
+            
+            etag = make_etag(user_id, feed['notifications_version'], params)
+            headers = event.get('headers', {}) or {}
+            if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+            
+            cache_headers = {**CACHE_HEADERS, 'ETag': etag}
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
+            if if_none_match == etag:
+                return {
+                    'statusCode': 304,
+                    'headers': {'Access-Control-Allow-Origin': '*', **cache_headers},
+                    'body': ''
+                }
+            
+            if since_id is not None:
+                notifications_list, next_since_id, has_more = get_new_notifications(
+                    conn, user_id, since_id, parse_limit(params)
+                )
+                return json_response({
                     'notifications': notifications_list,
-                    'unreadCount': unread_count
-                })
-            }
+                    'unreadCount': unread_count,
+                    'nextSinceId': next_since_id,
+                    'hasMore': has_more
+                }, headers=cache_headers)
+            
+            notifications_list, next_cursor = get_notifications_page(conn, user_id, after, parse_limit(params))
+            
+            return json_response({
+                'notifications': notifications_list,
+                'unreadCount': unread_count,
+                'nextCursor': next_cursor
+            }, headers=cache_headers)
         
         if method == 'PUT':
             body_data = json.loads(event.get('body', '{}'))
+            
+            if 'notificationIds' in body_data:
+                try:
+                    notification_ids = parse_ids(body_data['notificationIds'])
+                except InvalidBatch as e:
+                    return error_response(400, str(e))
+                
+                statuses = mark_read_batch(conn, user_id, notification_ids)
+                conn.commit()
+                
+                results = batch_results(notification_ids, statuses)
+                return json_response({
+                    'success': True,
+                    'updated': sum(1 for item in results if item['status'] == 'read'),
+                    'results': results
+                })
+            
             notification_id = body_data.get('notificationId')
             
             cursor.execute(
-                "UPDATE notifications SET is_read = true WHERE id = %s AND user_id = %s",
+                "UPDATE notifications SET is_read = true WHERE id = %s AND user_id = %s AND is_read = false",
                 (notification_id, user_id)
             )
+            adjust_unread_count(conn, user_id, -cursor.rowcount)
             conn.commit()
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'success': True})
-            }
+            return json_response({'success': True})
         
         if method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
@@ -128,30 +245,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     "UPDATE notifications SET is_read = true WHERE user_id = %s AND is_read = false",
                     (user_id,)
                 )
+                adjust_unread_count(conn, user_id, -cursor.rowcount)
                 conn.commit()
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'success': True})
-                }
+                return json_response({'success': True})
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return error_response(405, 'Method not allowed')
     
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+        return error_response(500, str(e))
     
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
@@ -7,108 +7,154 @@ Returns: HTTP response dict с данными профиля
 
 import json
 import os
+import sys
 from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
 
-def get_db_connection():
-    """Создание подключения к базе данных"""
-    database_url = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
 
+from shared.db import get_db_connection, get_read_connection, mark_write, release_connection, reroute_if_written
+from shared.http import error_response, json_response, preflight_response, request_telegram_id, wants_primary
+from shared.timing import instrument, timed
+from shared.users import resolve_user_id
+
+BOOTSTRAP_BOOKINGS_LIMIT = 20
+BOOTSTRAP_NOTIFICATIONS_LIMIT = 20
+
+def serialize_profile(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Строка users в формат ответа профиля"""
+    return {
+        'id': user['id'],
+        'telegramId': user['telegram_id'],
+        'firstName': user['first_name'],
+        'lastName': user['last_name'] or '',
+        'username': user['username'] or '',
+        'role': user['role'],
+        'phone': user['phone'] or '',
+        'bookingsCount': user['bookings_count'],
+        'createdAt': user['created_at'].isoformat()
+    }
+
+@timed('bootstrap')
+def get_bootstrap(conn, user_id: int) -> Dict[str, Any]:
+    """Профиль, последние записи и уведомления одним запросом в формате ответов profile, bookings и notifications"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """WITH recent_bookings AS (
+               SELECT b.id, b.booking_date, b.start_time,
+                      json_build_object(
+                          'id', b.id,
+                          'date', b.booking_date,
+                          'time', to_char(b.start_time, 'HH24:MI'),
+                          'endTime', to_char(b.end_time, 'HH24:MI'),
+                          'status', b.status,
+                          'masterName', m.first_name,
+                          'serviceName', s.name,
+                          'price', s.price::float8,
+                          'notes', b.notes
+                      ) AS item
+               FROM bookings b
+               JOIN users m ON b.master_id = m.id
+               JOIN services s ON b.service_id = s.id
+               WHERE b.client_id = %(user_id)s
+               ORDER BY b.booking_date DESC, b.start_time DESC, b.id DESC
+               LIMIT %(bookings_limit)s
+           ),
+           latest_notifications AS (
+               SELECT id, created_at,
+                      json_build_object(
+                          'id', id,
+                          'type', type,
+                          'title', title,
+                          'message', message,
+                          'isRead', is_read,
+                          'createdAt', created_at
+                      ) AS item
+               FROM notifications
+               WHERE user_id = %(user_id)s
+               ORDER BY created_at DESC, id DESC
+               LIMIT %(notifications_limit)s
+           )
+           SELECT u.id, u.telegram_id, u.first_name, u.last_name, u.username, u.role, u.phone,
+                  u.created_at, u.bookings_count, u.unread_notifications_count,
+                  COALESCE((SELECT json_agg(item ORDER BY booking_date DESC, start_time DESC, id DESC)
+                            FROM recent_bookings), '[]'::json) AS bookings,
+                  COALESCE((SELECT json_agg(item ORDER BY created_at DESC, id DESC)
+                            FROM latest_notifications), '[]'::json) AS notifications
+           FROM users u
+           WHERE u.id = %(user_id)s""",
+        {
+            'user_id': user_id,
+            'bookings_limit': BOOTSTRAP_BOOKINGS_LIMIT,
+            'notifications_limit': BOOTSTRAP_NOTIFICATIONS_LIMIT
+        }
+    )
+    row = cursor.fetchone()
+    
+    return {
+        'profile': serialize_profile(row),
+        'bookings': row['bookings'],
+        'notifications': row['notifications'],
+        'unreadCount': row['unread_notifications_count']
+    }
+
+PREFLIGHT_RESPONSE = preflight_response(
+    'GET, PUT, OPTIONS',
+    'Content-Type, X-Telegram-User, X-Read-Primary'
+)
+
+@instrument
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Telegram-User',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return PREFLIGHT_RESPONSE
     
     conn = None
     
     try:
-        conn = get_db_connection()
+        if method == 'GET':
+            conn = get_read_connection(request_telegram_id(event), wants_primary(event))
+        else:
+            mark_write(request_telegram_id(event))
+            conn = get_db_connection()
         telegram_user_header = event.get('headers', {}).get('X-Telegram-User', '{}')
         telegram_user = json.loads(telegram_user_header)
         
         if not telegram_user.get('id'):
-            return {
-                'statusCode': 401,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Unauthorized'})
-            }
+            return error_response(401, 'Unauthorized')
         
-        telegram_id = telegram_user.get('id')
         cursor = conn.cursor()
         
         if method == 'GET':
-            cursor.execute(
-                """SELECT id, telegram_id, first_name, last_name, username, role, phone, created_at
-                   FROM users WHERE telegram_id = %s""",
-                (telegram_id,)
-            )
-            user = cursor.fetchone()
+            user_id = resolve_user_id(conn, telegram_user)
+            conn = reroute_if_written(conn, telegram_user['id'])
+            cursor = conn.cursor()
+            
+            params = event.get('queryStringParameters', {}) or {}
             
-            if not user:
-                first_name = telegram_user.get('first_name', 'User')
-                last_name = telegram_user.get('last_name', '')
-                username = telegram_user.get('username', '')
-                
-                cursor.execute(
-                    """INSERT INTO users (telegram_id, first_name, last_name, username, role)
-                       VALUES (%s, %s, %s, %s, %s)
-                       RETURNING id, telegram_id, first_name, last_name, username, role, phone, created_at""",
-                    (telegram_id, first_name, last_name, username, 'client')
-                )
-                user = cursor.fetchone()
-                conn.commit()
+            if params.get('action') == 'bootstrap':
+                return json_response(get_bootstrap(conn, user_id))
             
             cursor.execute(
-                "SELECT COUNT(*) as count FROM bookings WHERE client_id = %s",
-                (user['id'],)
+                """SELECT id, telegram_id, first_name, last_name, username, role, phone, created_at,
+                          bookings_count
+                   FROM users WHERE id = %s""",
+                (user_id,)
             )
-            bookings_count = cursor.fetchone()['count']
+            user = cursor.fetchone()
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'id': user['id'],
-                    'telegramId': user['telegram_id'],
-                    'firstName': user['first_name'],
-                    'lastName': user['last_name'] or '',
-                    'username': user['username'] or '',
-                    'role': user['role'],
-                    'phone': user['phone'] or '',
-                    'bookingsCount': bookings_count,
-                    'createdAt': user['created_at'].isoformat()
-                })
-            }
+            return json_response(serialize_profile(user))
         
         if method == 'PUT':
             body_data = json.loads(event.get('body', '{}'))
             
-            cursor.execute("SELECT id FROM users WHERE telegram_id = %s", (telegram_id,))
-            user = cursor.fetchone()
+            user_id = resolve_user_id(conn, telegram_user, create=False)
             
-            if not user:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'User not found'})
-                }
+            if not user_id:
+                return error_response(404, 'User not found')
             
-            user_id = user['id']
             first_name = body_data.get('firstName')
             last_name = body_data.get('lastName', '')
             phone = body_data.get('phone', '')
@@ -121,28 +167,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             )
             conn.commit()
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'success': True})
-            }
+            return json_response({'success': True})
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return error_response(405, 'Method not allowed')
     
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+        return error_response(500, str(e))
     
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
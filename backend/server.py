@@ -0,0 +1,358 @@
+'''
+Business: Долгоживущий HTTP-сервер для самостоятельного размещения - все функции из func2url.json
+          за одним asyncio-сервером: /bookings, /profile, /notifications вызывают их handler
+Args: DATABASE_URL (и остальные переменные функций), --host/--port (SERVER_HOST, SERVER_PORT),
+      --threads (SERVER_THREADS) - потоки для блокирующих handler, по умолчанию DB_POOL_MAX_SIZE,
+      --workers (SERVER_WORKERS) - число процессов на общем сокете, --shutdown-timeout, --max-pending
+Returns: отвечает по HTTP/1.1 с keep-alive; по SIGTERM/SIGINT перестаёт принимать запросы,
+         дожидается начатых и закрывает пулы подключений
+'''
+
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+# Запуск python server.py из backend: каталог скрипта уже в sys.path, shared импортируется напрямую
+BACKEND_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = int(os.environ.get('SERVER_MAX_BODY_BYTES', str(1024 * 1024)))
+KEEPALIVE_TIMEOUT = float(os.environ.get('SERVER_KEEPALIVE_TIMEOUT', '15'))
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+
+class BadRequest(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Context:
+    """context вызова в том виде, в каком его передаёт платформа: request_id и function_name"""
+
+    def __init__(self, request_id: str, function_name: str):
+        self.request_id = request_id
+        self.function_name = function_name
+
+
+def load_handlers() -> Dict[str, Handler]:
+    """handler каждой функции из func2url.json; модули грузятся под своими именами, index.py у всех одинаковый"""
+    import importlib.util
+
+    with open(os.path.join(BACKEND_ROOT, 'func2url.json')) as f:
+        functions = json.load(f)
+
+    handlers = {}
+    for name in functions:
+        spec = importlib.util.spec_from_file_location(f'{name}_index', os.path.join(BACKEND_ROOT, name, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        handlers[name] = module.handler
+    return handlers
+
+
+def canonical_header(name: str) -> str:
+    """x-telegram-user -> X-Telegram-User: handler читают заголовки в этом регистре"""
+    return '-'.join(part.capitalize() for part in name.split('-'))
+
+
+def to_event(method: str, target: str, headers: Dict[str, str], body: bytes,
+             request_id: str, peer: Optional[Tuple[Any, ...]]) -> Dict[str, Any]:
+    """HTTP-запрос в event платформы: httpMethod, headers, queryStringParameters, body"""
+    url = urlsplit(target)
+    try:
+        text, encoded = body.decode('utf-8'), False
+    except UnicodeDecodeError:
+        text, encoded = base64.b64encode(body).decode('ascii'), True
+    return {
+        'httpMethod': method,
+        'path': url.path,
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(url.query, keep_blank_values=True)),
+        'body': text,
+        'isBase64Encoded': encoded,
+        'requestContext': {
+            'requestId': request_id,
+            'httpMethod': method,
+            'identity': {'sourceIp': peer[0] if peer else None}
+        }
+    }
+
+
+def json_response(status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {'statusCode': status, 'headers': {**JSON_HEADERS, **(headers or {})}, 'body': json.dumps(payload)}
+
+
+class Server:
+    """Один процесс: asyncio принимает соединения, handler выполняются в ограниченном пуле потоков"""
+
+    def __init__(self, handlers: Dict[str, Handler], threads: int, max_pending: int, shutdown_timeout: float):
+        self.handlers = handlers
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='handler')
+        self.max_pending = max_pending
+        self.shutdown_timeout = shutdown_timeout
+        self.in_flight = 0
+        self.drained = asyncio.Event()
+        self.drained.set()
+        self.stopping = False
+        # Соединения, ждущие следующий запрос keep-alive: при остановке их можно закрыть сразу
+        self.idle_writers: set = set()
+        self.writers: set = set()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.writers.add(writer)
+        peer = writer.get_extra_info('peername')
+        try:
+            while not self.stopping:
+                self.idle_writers.add(writer)
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self.write_response(writer, json_response(431, {'error': 'Headers too large'}), False)
+                    return
+                finally:
+                    self.idle_writers.discard(writer)
+
+                try:
+                    method, target, headers, keep_alive, length = self.parse_head(head)
+                    if length > MAX_BODY_BYTES:
+                        raise BadRequest(413, 'Request body too large')
+                    body = await reader.readexactly(length) if length else b''
+                except BadRequest as e:
+                    await self.write_response(writer, json_response(e.status, {'error': str(e)}), False)
+                    return
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+
+                response = await self.dispatch(method, target, headers, body, peer)
+                keep_alive = keep_alive and not self.stopping
+                await self.write_response(writer, response, keep_alive, head_only=method == 'HEAD')
+                if not keep_alive:
+                    return
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    def parse_head(head: bytes) -> Tuple[str, str, Dict[str, str], bool, int]:
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise BadRequest(400, 'Malformed request line')
+
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise BadRequest(400, 'Malformed header')
+            name, value = canonical_header(name.strip()), value.strip()
+            headers[name] = f'{headers[name]}, {value}' if name in headers else value
+
+        if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            raise BadRequest(411, 'Chunked request bodies are not supported, send Content-Length')
+        try:
+            length = int(headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise BadRequest(400, 'Invalid Content-Length')
+
+        connection = headers.get('Connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method.upper(), target, headers, keep_alive, length
+
+    async def dispatch(self, method: str, target: str, headers: Dict[str, str], body: bytes,
+                       peer: Optional[Tuple[Any, ...]]) -> Dict[str, Any]:
+        path = urlsplit(target).path.strip('/')
+        if path == 'healthz':
+            if self.stopping:
+                return json_response(503, {'status': 'stopping'})
+            return json_response(200, {'status': 'ok', 'inFlight': self.in_flight})
+
+        function_name = path.split('/', 1)[0]
+        handler = self.handlers.get(function_name)
+        if handler is None:
+            return json_response(404, {'error': f'Unknown function {function_name or "/"}'})
+        if self.in_flight >= self.max_pending:
+            return json_response(503, {'error': 'Server is overloaded'}, {'Retry-After': '1'})
+
+        request_id = headers.get('X-Request-Id') or str(uuid.uuid4())
+        event = to_event('GET' if method == 'HEAD' else method, target, headers, body, request_id, peer)
+        self.in_flight += 1
+        self.drained.clear()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, handler, event, Context(request_id, function_name))
+        except Exception as e:
+            print(json.dumps({'requestId': request_id, 'function': function_name,
+                              'error': f'{type(e).__name__}: {e}'}), file=sys.stderr, flush=True)
+            return json_response(500, {'error': 'Internal server error'})
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.drained.set()
+
+    @staticmethod
+    async def write_response(writer: asyncio.StreamWriter, response: Dict[str, Any], keep_alive: bool,
+                             head_only: bool = False) -> None:
+        status = int(response.get('statusCode', 200))
+        body = response.get('body') or ''
+        if response.get('isBase64Encoded'):
+            payload = base64.b64decode(body)
+        else:
+            payload = body.encode('utf-8') if isinstance(body, str) else json.dumps(body).encode('utf-8')
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ''
+
+        lines = [f'HTTP/1.1 {status} {reason}']
+        for name, value in (response.get('headers') or {}).items():
+            if name.lower() not in ('content-length', 'connection', 'transfer-encoding'):
+                lines.append(f'{name}: {value}')
+        lines.append(f'Content-Length: {len(payload)}')
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if not head_only and status != 304:
+            writer.write(payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def serve(self, sock: socket.socket) -> None:
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+
+        server = await asyncio.start_server(self.handle_connection, sock=sock, limit=MAX_HEADER_BYTES)
+        print(json.dumps({'event': 'listening', 'pid': os.getpid(), 'address': sock.getsockname()[:2],
+                          'functions': sorted(self.handlers), 'threads': self.threads}),
+              flush=True)
+        await stop.wait()
+        await self.shutdown(server)
+
+    async def shutdown(self, server: asyncio.AbstractServer) -> None:
+        """Перестать принимать соединения, закрыть простаивающие, дождаться начатых запросов"""
+        self.stopping = True
+        server.close()
+        for writer in list(self.idle_writers):
+            writer.close()
+        try:
+            await asyncio.wait_for(self.drained.wait(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            print(json.dumps({'event': 'shutdown_timeout', 'pid': os.getpid(), 'inFlight': self.in_flight}),
+                  file=sys.stderr, flush=True)
+        for writer in list(self.writers):
+            writer.close()
+        await server.wait_closed()
+
+        # Потоки handler не прерываются: запрос, не уложившийся в shutdown_timeout, дорабатывает до конца
+        self.executor.shutdown(wait=True)
+        from shared.db import close_all_pools
+        close_all_pools()
+        print(json.dumps({'event': 'stopped', 'pid': os.getpid()}), flush=True)
+
+
+def run_worker(sock: socket.socket, handlers: Dict[str, Handler], args: argparse.Namespace) -> None:
+    # Процесс, запущенный супервизором, наследует его обработчики сигналов до запуска цикла
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    server = Server(handlers, args.threads, args.max_pending, args.shutdown_timeout)
+    asyncio.run(server.serve(sock))
+
+
+def supervise(sock: socket.socket, handlers: Dict[str, Handler], args: argparse.Namespace) -> None:
+    """
+    Несколько процессов принимают соединения с одного сокета; упавший процесс перезапускается.
+    SIGTERM/SIGINT пересылается процессам, каждый завершается сам после своих запросов
+    """
+    context = multiprocessing.get_context('fork')
+    stop = threading.Event()
+
+    def spawn():
+        process = context.Process(target=run_worker, args=(sock, handlers, args), daemon=False)
+        process.start()
+        return process
+
+    def forward(signum, frame):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    processes = [spawn() for _ in range(args.workers)]
+    while not stop.wait(0.5):
+        for index, process in enumerate(processes):
+            if not process.is_alive():
+                print(json.dumps({'event': 'worker_exited', 'pid': process.pid, 'exitcode': process.exitcode}),
+                      file=sys.stderr, flush=True)
+                processes[index] = spawn()
+
+    for process in processes:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+    for process in processes:
+        process.join(args.shutdown_timeout + 5)
+        if process.is_alive():
+            process.kill()
+    sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default=os.environ.get('SERVER_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SERVER_PORT', '8000')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVER_WORKERS', '1')))
+    parser.add_argument('--threads', type=int,
+                        default=int(os.environ.get('SERVER_THREADS', os.environ.get('DB_POOL_MAX_SIZE', '4'))))
+    parser.add_argument('--max-pending', type=int, help='запросов в обработке на процесс, дальше 503; '
+                                                        'по умолчанию 8 на поток')
+    parser.add_argument('--shutdown-timeout', type=float,
+                        default=float(os.environ.get('SERVER_SHUTDOWN_TIMEOUT', '30')))
+    args = parser.parse_args()
+    args.threads = max(1, args.threads)
+    args.max_pending = args.max_pending or args.threads * 8
+
+    # Каждому потоку - своё подключение: пул shared.db создаётся по DB_POOL_MAX_SIZE при первом запросе
+    pool_size = int(os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.threads)))
+    if pool_size < args.threads:
+        print(f'DB_POOL_MAX_SIZE={pool_size} is below --threads={args.threads}: '
+              f'handlers will wait for connections', file=sys.stderr)
+
+    # handler загружаются до fork: ошибки импорта видны сразу, а процессы делят страницы модулей.
+    # Пулы подключений ленивые, поэтому процессы не наследуют открытых сокетов к базе
+    handlers = load_handlers()
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.setblocking(False)
+
+    if args.workers <= 1:
+        run_worker(sock, handlers, args)
+        sock.close()
+    else:
+        supervise(sock, handlers, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,3 @@
+'''
+Общий код для функций backend: пул подключений к базе данных и вспомогательные утилиты.
+'''
@@ -0,0 +1,30 @@
+'''
+Business: Пакетные изменения - разбор списка id из тела запроса и результат по каждому id
+Args: список id из JSON тела, MAX_BATCH_SIZE - максимальный размер пакета
+Returns: проверенный список id без повторов и список {id, status} для ответа
+'''
+
+import os
+from typing import Any, Dict, List
+
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '500'))
+
+
+class InvalidBatch(ValueError):
+    """Список id пуст, слишком велик или содержит не целые числа"""
+
+
+def parse_ids(value: Any, max_size: int = MAX_BATCH_SIZE) -> List[int]:
+    """Список id из тела запроса без повторов, в исходном порядке"""
+    if not isinstance(value, list) or not value:
+        raise InvalidBatch('Expected a non-empty list of ids')
+    if len(value) > max_size:
+        raise InvalidBatch(f'At most {max_size} ids per request')
+    if any(isinstance(item, bool) or not isinstance(item, int) for item in value):
+        raise InvalidBatch('Ids must be integers')
+    return list(dict.fromkeys(value))
+
+
+def batch_results(ids: List[int], statuses: Dict[int, str], missing: str = 'not_found') -> List[Dict[str, Any]]:
+    """Статус каждого запрошенного id; id, не попавшие в выборку, получают статус missing"""
+    return [{'id': item, 'status': statuses.get(item, missing)} for item in ids]
@@ -0,0 +1,82 @@
+'''
+Business: In-process LRU-кэш с TTL для тёплых контейнеров функций
+Args: max_size - максимум записей, ttl - время жизни записи в секундах
+Returns: LRUCache со счётчиками попаданий, промахов, вытеснений и устаревших версий
+'''
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш: при переполнении вытесняется давно не читанная запись"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._data: 'OrderedDict[Hashable, Tuple[Any, float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale = 0
+
+    def get(self, key: Hashable, default: Any = None, version: Any = None) -> Any:
+        """Значение по ключу или default, если записи нет, истёк TTL или версия не совпала"""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at, stored_version = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            if version is not None and stored_version != version:
+                del self._data[key]
+                self.stale += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, version: Any = None) -> None:
+        """Сохранить значение (с версией данных), вытеснив самую старую запись при переполнении"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl, version)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Счётчики для подбора размера кэша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxSize': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'stale': self.stale,
+                'hitRate': round(self.hits / lookups, 4) if lookups else None
+            }
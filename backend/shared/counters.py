@@ -0,0 +1,70 @@
+'''
+Business: Счётчики пользователя в таблице users - число записей и непрочитанных уведомлений
+Args: conn - подключение в открытой транзакции обработчика, user_id, изменение счётчика
+Returns: обновления выполняются в той же транзакции, что и изменение данных
+'''
+
+from typing import List, Optional
+
+
+def increment_bookings_count(conn, user_id: int, delta: int = 1) -> None:
+    """Изменить bookings_count клиента"""
+    if not delta:
+        return
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE users SET bookings_count = bookings_count + %s WHERE id = %s",
+        (delta, user_id)
+    )
+
+
+def adjust_unread_count(conn, user_id: int, delta: int) -> None:
+    """Изменить unread_notifications_count пользователя (не ниже нуля) и версию его ленты уведомлений"""
+    if not delta:
+        return
+    cursor = conn.cursor()
+    cursor.execute(
+        """UPDATE users SET unread_notifications_count = GREATEST(unread_notifications_count + %s, 0),
+                            notifications_version = notifications_version + 1
+           WHERE id = %s""",
+        (delta, user_id)
+    )
+
+
+def repair_counters(conn, id_from: int, id_to: int) -> List[int]:
+    """Пересчитать счётчики пользователей с id в [id_from, id_to); вернуть id исправленных строк
+
+    Строки пачки сначала блокируются в порядке id: транзакции, уже изменившие счётчик, к этому моменту
+    зафиксированы, а новые ждут конца пересчёта. Подсчёт идёт следующим запросом, со снимком после
+    блокировки, поэтому в READ COMMITTED не записывает устаревшие значения поверх свежих инкрементов.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id FROM users WHERE id >= %s AND id < %s ORDER BY id FOR UPDATE",
+        (id_from, id_to)
+    )
+    cursor.execute(
+        """WITH actual AS (
+               SELECT u.id,
+                      (SELECT COUNT(*) FROM bookings b WHERE b.client_id = u.id) AS bookings_count,
+                      (SELECT COUNT(*) FROM notifications n
+                       WHERE n.user_id = u.id AND n.is_read = false) AS unread_count
+               FROM users u
+               WHERE u.id >= %s AND u.id < %s
+           )
+           UPDATE users u
+           SET bookings_count = a.bookings_count,
+               unread_notifications_count = a.unread_count
+           FROM actual a
+           WHERE u.id = a.id
+             AND (u.bookings_count != a.bookings_count OR u.unread_notifications_count != a.unread_count)
+           RETURNING u.id""",
+        (id_from, id_to)
+    )
+    return [row['id'] for row in cursor.fetchall()]
+
+
+def max_user_id(conn) -> Optional[int]:
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(id) AS max_id FROM users")
+    return cursor.fetchone()['max_id']
@@ -0,0 +1,284 @@
+'''
+Business: Пул подключений к PostgreSQL, общий для функций bookings, profile и notifications
+Args: DATABASE_URL - строка подключения к основной базе
+      DATABASE_REPLICA_URL - необязательная реплика для чтений, допускающих небольшое отставание
+      REPLICA_STICKY_SECONDS - сколько после записи пользователя его чтения идут в основную базу
+      DB_POOL_MAX_SIZE, DB_POOL_IDLE_TIMEOUT, DB_POOL_HEALTH_CHECK_INTERVAL - настройки пула
+Returns: get_db_connection/get_read_connection/release_connection для использования в handler
+'''
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.cache import LRUCache
+from shared.timing import instrumented_cursor_class, timed
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+
+# Пользователи, недавно писавшие через этот контейнер: их чтения видят собственные изменения.
+# Другие контейнеры узнают о записи по заголовку X-Read-Primary, который клиент шлёт после POST/PUT
+STICKY_WRITERS = LRUCache(
+    max_size=int(os.environ.get('REPLICA_STICKY_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('REPLICA_STICKY_SECONDS', '5'))
+)
+
+# Значения psycopg2.extensions.TRANSACTION_STATUS_*; psycopg2 импортируется только при первом подключении,
+# чтобы холодный старт и OPTIONS не платили за загрузку драйвера
+TRANSACTION_STATUS_IDLE = 0
+TRANSACTION_STATUS_UNKNOWN = 4
+
+# Класс курсора для новых подключений; None - инструментированный RealDictCursor из shared.timing.
+# Бенчмарки подменяют его счётчиком запросов
+cursor_factory: Any = None
+
+
+class PoolExhausted(Exception):
+    """Все подключения пула заняты дольше допустимого времени ожидания"""
+
+
+_connection_class = None
+
+
+def pooled_connection_class():
+    """Класс подключения, которое знает, в какой пул его вернуть"""
+    global _connection_class
+    if _connection_class is None:
+        from psycopg2 import extensions
+
+        class PooledConnection(extensions.connection):
+            pool: Optional['ConnectionPool'] = None
+            # Имена запросов, подготовленных в этой сессии (shared.prepared)
+            prepared: Optional[set] = None
+
+        _connection_class = PooledConnection
+    return _connection_class
+
+
+class ConnectionPool:
+    """Потокобезопасный пул подключений, переживающий тёплые вызовы контейнера"""
+
+    def __init__(self, dsn: str, read_only: bool = False, max_size: int = POOL_MAX_SIZE,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT,
+                 health_check_interval: float = POOL_HEALTH_CHECK_INTERVAL,
+                 acquire_timeout: float = POOL_ACQUIRE_TIMEOUT):
+        self.dsn = dsn
+        self.read_only = read_only
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.stats: Dict[str, int] = {'created': 0, 'reused': 0, 'discarded': 0}
+
+    def _connect(self):
+        import psycopg2
+
+        conn = psycopg2.connect(self.dsn, connection_factory=pooled_connection_class(),
+                                cursor_factory=cursor_factory or instrumented_cursor_class())
+        conn.pool = self
+        conn.prepared = set()
+        if self.read_only:
+            # Реплика обслуживает только чтения: сессия сразу в autocommit, BEGIN/ROLLBACK не отправляются
+            conn.set_session(readonly=True, autocommit=True)
+        self.stats['created'] += 1
+        return conn
+
+    def _close_quietly(self, conn) -> None:
+        import psycopg2
+
+        self.stats['discarded'] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _is_healthy(self, conn) -> bool:
+        """Проверка подключения перед выдачей: SELECT 1 и откат"""
+        import psycopg2
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _prune_idle(self, now: float) -> List[Any]:
+        """Убрать из пула подключения, простоявшие дольше idle_timeout"""
+        expired = [conn for conn, released_at in self._idle if now - released_at > self.idle_timeout]
+        if expired:
+            self._idle = [(conn, released_at) for conn, released_at in self._idle
+                          if now - released_at <= self.idle_timeout]
+        return expired
+
+    def acquire(self):
+        """Взять подключение из пула или создать новое, если лимит не исчерпан"""
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            candidate: Optional[Tuple[Any, float]] = None
+
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    expired = self._prune_idle(now)
+                    if self._idle:
+                        candidate = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._in_use < self.max_size:
+                        self._in_use += 1
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolExhausted(f'No free connections after {self.acquire_timeout}s')
+                    self._cond.wait(remaining)
+
+            for conn in expired:
+                self._close_quietly(conn)
+
+            if candidate is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._forget()
+                    raise
+
+            conn, released_at = candidate
+            needs_check = time.monotonic() - released_at > self.health_check_interval
+            if not conn.closed and (not needs_check or self._is_healthy(conn)):
+                self.stats['reused'] += 1
+                return conn
+
+            self._close_quietly(conn)
+            self._forget()
+
+    def _forget(self) -> None:
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def release(self, conn) -> None:
+        """Вернуть подключение в пул; незавершённая транзакция откатывается, сломанное подключение закрывается"""
+        import psycopg2
+
+        reusable = not conn.closed
+        if reusable:
+            status = conn.info.transaction_status
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                reusable = False
+            elif status != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    reusable = False
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+        if not reusable:
+            self._close_quietly(conn)
+
+    def close_all(self) -> None:
+        """Закрыть все свободные подключения (при остановке процесса)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: Optional[str] = None, read_only: bool = False) -> ConnectionPool:
+    """Пул уровня модуля для строки подключения (по умолчанию DATABASE_URL)"""
+    dsn = dsn or os.environ.get('DATABASE_URL')
+    pool = _pools.get(dsn)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(dsn)
+            if pool is None:
+                pool = ConnectionPool(dsn, read_only=read_only)
+                _pools[dsn] = pool
+    return pool
+
+
+def _with_autocommit(conn, autocommit: bool):
+    """Переключить режим выданного подключения; psycopg2 меняет его на клиенте, без запроса к серверу"""
+    if conn.autocommit != autocommit:
+        conn.autocommit = autocommit
+    return conn
+
+
+@timed('connect')
+def get_db_connection():
+    """Подключение для записи: запросы идут в транзакции до commit/rollback обработчика"""
+    return _with_autocommit(get_pool().acquire(), False)
+
+
+def is_read_only(conn) -> bool:
+    """Подключение выдано пулом реплики: писать через него нельзя"""
+    return bool(conn.pool and conn.pool.read_only)
+
+
+def mark_write(telegram_id: Any) -> None:
+    """Запомнить запись пользователя: его чтения в ближайшие REPLICA_STICKY_SECONDS идут в основную базу"""
+    if telegram_id:
+        STICKY_WRITERS.set(telegram_id, True)
+
+
+@timed('connect')
+def get_read_connection(telegram_id: Any = None, require_primary: bool = False):
+    """
+    Подключение для чтения: реплика, если задан DATABASE_REPLICA_URL и пользователь не писал только что,
+    иначе основная база. Недоступная реплика не роняет запрос - чтение уходит в основную базу.
+    Чтения выполняются в autocommit: под READ COMMITTED каждый запрос и так видит свой снимок,
+    а подключение возвращается в пул без лишнего ROLLBACK
+    """
+    replica_dsn = os.environ.get('DATABASE_REPLICA_URL')
+    if not replica_dsn or require_primary or (telegram_id and STICKY_WRITERS.get(telegram_id)):
+        return _with_autocommit(get_pool().acquire(), True)
+
+    import psycopg2
+
+    try:
+        return get_pool(replica_dsn, read_only=True).acquire()
+    except (psycopg2.OperationalError, PoolExhausted):
+        return _with_autocommit(get_pool().acquire(), True)
+
+
+def reroute_if_written(conn, telegram_id: Any):
+    """
+    Подключение к реплике заменяется основным, если пользователь записал что-то в ходе этого запроса
+    (например, был создан при первом входе): дальнейшие чтения должны видеть эту запись
+    """
+    if is_read_only(conn) and telegram_id and STICKY_WRITERS.get(telegram_id):
+        release_connection(conn)
+        return _with_autocommit(get_pool().acquire(), True)
+    return conn
+
+
+def release_connection(conn) -> None:
+    """Возврат подключения в пул, из которого оно было выдано"""
+    (conn.pool or get_pool()).release(conn)
+
+
+def close_all_pools() -> None:
+    """Закрыть свободные подключения во всех пулах"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
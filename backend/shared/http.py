@@ -0,0 +1,86 @@
+'''
+Business: Готовые HTTP-ответы для handler - заранее собранные заголовки CORS и сериализация JSON
+Args: payload - данные ответа, status - HTTP-код, headers - дополнительные заголовки
+Returns: dict ответа в формате платформы (statusCode, headers, body)
+'''
+
+import json
+import os
+from typing import Any, Dict, Optional
+
+from shared.timing import timed
+
+# orjson быстрее сериализует большие ответы, но сам импортируется ~10 мс;
+# включается через FAST_JSON=1 и загружается при первом ответе, а не при холодном старте
+FAST_JSON = os.environ.get('FAST_JSON') == '1'
+_orjson: Any = None
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+
+@timed('serialize')
+def dumps(payload: Any) -> str:
+    """JSON-строка ответа; orjson при FAST_JSON=1, если он установлен, иначе стандартный json"""
+    global _orjson, FAST_JSON
+    if FAST_JSON:
+        if _orjson is None:
+            try:
+                import orjson
+                _orjson = orjson
+            except ImportError:
+                FAST_JSON = False
+                return json.dumps(payload)
+        return _orjson.dumps(payload).decode()
+    return json.dumps(payload)
+
+
+def json_response(payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': {**JSON_HEADERS, **headers} if headers else JSON_HEADERS,
+        'body': dumps(payload)
+    }
+
+
+def error_response(status: int, message: str) -> Dict[str, Any]:
+    return json_response({'error': message}, status)
+
+
+def int_param(params: Dict[str, Any], name: str, default: Optional[int] = None) -> Optional[int]:
+    """Целочисленный параметр запроса или default, если его нет; ValueError, если значение не число"""
+    value = params.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Parameter "{name}" must be an integer') from None
+
+
+def request_telegram_id(event: Dict[str, Any]) -> Optional[Any]:
+    """id пользователя из заголовка X-Telegram-User для маршрутизации чтений; None, если заголовка нет"""
+    try:
+        telegram_user = json.loads((event.get('headers') or {}).get('X-Telegram-User') or '{}')
+    except ValueError:
+        return None
+    return telegram_user.get('id') if isinstance(telegram_user, dict) else None
+
+
+def wants_primary(event: Dict[str, Any]) -> bool:
+    """Клиент недавно писал (через любой контейнер) и просит читать из основной базы"""
+    headers = event.get('headers') or {}
+    return (headers.get('X-Read-Primary') or headers.get('x-read-primary')) == '1'
+
+
+def preflight_response(methods: str, allow_headers: str) -> Dict[str, Any]:
+    """Ответ на OPTIONS; собирается один раз при импорте модуля функции"""
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': allow_headers,
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': ''
+    }
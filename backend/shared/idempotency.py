@@ -0,0 +1,93 @@
+'''
+Business: Ключи идемпотентности для создания записей - повтор запроса с тем же Idempotency-Key
+          возвращает исходный результат, параллельные дубли сводятся к одной вставке уникальным ключом
+Args: conn - подключение в открытой транзакции обработчика, IDEMPOTENCY_KEY_TTL_HOURS - срок хранения ключа
+Returns: claim_key - можно ли выполнять запрос или id уже созданной записи
+'''
+
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(ValueError):
+    """Ключ уже использован для запроса с другим телом"""
+
+
+def idempotency_key(event: Dict[str, Any]) -> Optional[str]:
+    """Значение заголовка Idempotency-Key; ValueError, если ключ длиннее MAX_KEY_LENGTH"""
+    headers = event.get('headers') or {}
+    key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+    if key and len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters')
+    return key or None
+
+
+def request_fingerprint(payload: Dict[str, Any]) -> str:
+    """Отпечаток значимых полей запроса: повтор с тем же ключом, но другим телом - ошибка клиента"""
+    import hashlib
+
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def claim_key(conn, user_id: int, key: str, fingerprint: str) -> Tuple[bool, Optional[int]]:
+    """
+    Занять ключ в текущей транзакции: (True, None) - запрос выполняется впервые.
+    Параллельный дубль ждёт на уникальном ключе commit первого запроса и получает (False, booking_id);
+    если первый откатился, ключ достаётся дублю. Просроченный ключ занимается заново
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO booking_idempotency_keys AS k (user_id, idempotency_key, request_hash, expires_at)
+           VALUES (%s, %s, %s, CURRENT_TIMESTAMP + %s * interval '1 hour')
+           ON CONFLICT (user_id, idempotency_key) DO UPDATE
+           SET request_hash = EXCLUDED.request_hash, booking_id = NULL,
+               created_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at
+           WHERE k.expires_at < CURRENT_TIMESTAMP
+           RETURNING k.user_id""",
+        (user_id, key, fingerprint, IDEMPOTENCY_KEY_TTL_HOURS)
+    )
+    if cursor.fetchone():
+        return True, None
+
+    cursor.execute(
+        """SELECT request_hash, booking_id FROM booking_idempotency_keys
+           WHERE user_id = %s AND idempotency_key = %s""",
+        (user_id, key)
+    )
+    stored = cursor.fetchone()
+    if stored is None:
+        # Просроченный ключ удалили между запросами - занимаем его заново
+        return claim_key(conn, user_id, key, fingerprint)
+    if stored['request_hash'] != fingerprint:
+        raise IdempotencyConflict('Idempotency-Key was already used for a different request')
+    return False, stored['booking_id']
+
+
+def complete_key(conn, user_id: int, key: str, booking_id: int) -> None:
+    """Сохранить результат под ключом в той же транзакции, что и саму запись"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """UPDATE booking_idempotency_keys SET booking_id = %s
+           WHERE user_id = %s AND idempotency_key = %s""",
+        (booking_id, user_id, key)
+    )
+
+
+def delete_expired_keys(conn, batch_size: int) -> int:
+    """Удалить пачку просроченных ключей; вернуть число удалённых"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """DELETE FROM booking_idempotency_keys
+           WHERE (user_id, idempotency_key) IN (
+               SELECT user_id, idempotency_key FROM booking_idempotency_keys
+               WHERE expires_at < CURRENT_TIMESTAMP
+               LIMIT %s
+               FOR UPDATE SKIP LOCKED
+           )""",
+        (batch_size,)
+    )
+    return cursor.rowcount
@@ -0,0 +1,91 @@
+'''
+Business: Ежедневные агрегаты мастера в master_daily_stats - записи, отмены, завершения, занятые минуты, выручка
+Args: conn - подключение в открытой транзакции обработчика, изменения статусов записей
+Returns: агрегаты меняются на разницу вкладов старого и нового статуса в той же транзакции, что и запись
+'''
+
+from typing import List, Optional, Tuple
+
+# Вклад записи в агрегат: строка со знаком +1 для текущего статуса и -1 для прежнего
+CONTRIBUTIONS = """SELECT b.master_id, b.booking_date, v.status, v.sign,
+                  EXTRACT(EPOCH FROM b.end_time - b.start_time) / 60 AS minutes, s.price"""
+
+# Сложить вклады из CTE deltas в master_daily_stats
+UPSERT_DELTAS = """INSERT INTO master_daily_stats AS m (master_id, stat_date, bookings_count, cancelled_count,
+                                                completed_count, booked_minutes, booked_revenue, completed_revenue)
+           SELECT master_id, booking_date,
+                  COALESCE(SUM(sign), 0),
+                  COALESCE(SUM(sign) FILTER (WHERE status = 'cancelled'), 0),
+                  COALESCE(SUM(sign) FILTER (WHERE status = 'completed'), 0),
+                  COALESCE(SUM(sign * minutes) FILTER (WHERE status != 'cancelled'), 0),
+                  COALESCE(SUM(sign * price) FILTER (WHERE status != 'cancelled'), 0),
+                  COALESCE(SUM(sign * price) FILTER (WHERE status = 'completed'), 0)
+           FROM deltas
+           GROUP BY master_id, booking_date
+           ORDER BY master_id, booking_date
+           ON CONFLICT (master_id, stat_date) DO UPDATE
+           SET bookings_count = m.bookings_count + EXCLUDED.bookings_count,
+               cancelled_count = m.cancelled_count + EXCLUDED.cancelled_count,
+               completed_count = m.completed_count + EXCLUDED.completed_count,
+               booked_minutes = m.booked_minutes + EXCLUDED.booked_minutes,
+               booked_revenue = m.booked_revenue + EXCLUDED.booked_revenue,
+               completed_revenue = m.completed_revenue + EXCLUDED.completed_revenue,
+               updated_at = CURRENT_TIMESTAMP"""
+
+
+def record_booking_changes(conn, changes: List[Tuple[int, Optional[str]]]) -> None:
+    """
+    Учесть изменения записей (booking_id, прежний статус или None для новой записи) одним upsert;
+    новый статус читается из bookings, поэтому вызывать после UPDATE/INSERT записи
+    """
+    if not changes:
+        return
+    booking_ids, previous_statuses = (list(column) for column in zip(*changes))
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""WITH changes AS (
+               SELECT * FROM unnest(%s::bigint[], %s::text[]) AS c(booking_id, previous_status)
+           ), deltas AS (
+               {CONTRIBUTIONS}
+               FROM changes c
+               JOIN bookings b ON b.id = c.booking_id
+               JOIN services s ON s.id = b.service_id
+               CROSS JOIN LATERAL (VALUES (b.status::text, 1), (c.previous_status, -1)) AS v(status, sign)
+               WHERE v.status IS NOT NULL
+           )
+           {UPSERT_DELTAS}""",
+        (booking_ids, previous_statuses)
+    )
+
+
+def rebuild_master_stats(conn, date_from: str, date_to: str) -> int:
+    """
+    Пересчитать агрегаты за [date_from, date_to] по bookings; вернуть число строк.
+    Блокировка таблицы ждёт транзакции, уже изменившие агрегаты, и задерживает новые приращения
+    до commit пересчёта, поэтому ни одно изменение не теряется и не учитывается дважды
+    """
+    cursor = conn.cursor()
+    cursor.execute("LOCK TABLE master_daily_stats IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute(
+        "DELETE FROM master_daily_stats WHERE stat_date BETWEEN %s AND %s",
+        (date_from, date_to)
+    )
+    cursor.execute(
+        f"""WITH deltas AS (
+               {CONTRIBUTIONS}
+               FROM bookings b
+               JOIN services s ON s.id = b.service_id
+               CROSS JOIN LATERAL (VALUES (b.status::text, 1)) AS v(status, sign)
+               WHERE b.booking_date BETWEEN %s AND %s
+           )
+           {UPSERT_DELTAS}""",
+        (date_from, date_to)
+    )
+    return cursor.rowcount
+
+
+def booking_date_bounds(conn) -> Tuple[Optional[str], Optional[str]]:
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(booking_date) AS min_date, MAX(booking_date) AS max_date FROM bookings")
+    row = cursor.fetchone()
+    return row['min_date'], row['max_date']
@@ -0,0 +1,31 @@
+'''
+Business: Запись событий уведомлений в notification_outbox в транзакции обработчика
+Args: conn - подключение в открытой транзакции, данные уведомления
+Returns: событие становится видно воркеру доставки только после commit обработчика
+'''
+
+from typing import List, Optional, Tuple
+
+
+def enqueue_notification(conn, user_id: int, booking_id: Optional[int], notification_type: str,
+                         title: str, message: str) -> None:
+    """Добавить событие уведомления в outbox"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO notification_outbox (user_id, booking_id, type, title, message)
+           VALUES (%s, %s, %s, %s, %s)""",
+        (user_id, booking_id, notification_type, title, message)
+    )
+
+
+def enqueue_notifications(conn, events: List[Tuple[int, Optional[int], str, str, str]]) -> None:
+    """Добавить пакет событий (user_id, booking_id, type, title, message) в outbox одним INSERT"""
+    if not events:
+        return
+    user_ids, booking_ids, types, titles, messages = (list(column) for column in zip(*events))
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO notification_outbox (user_id, booking_id, type, title, message)
+           SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::text[], %s::text[], %s::text[])""",
+        (user_ids, booking_ids, types, titles, messages)
+    )
@@ -0,0 +1,73 @@
+'''
+Business: Курсорная (keyset) пагинация - непрозрачный курсор и разбор limit
+Args: значения ключа сортировки последней строки страницы, queryStringParameters
+Returns: строка курсора для клиента и обратное преобразование
+'''
+
+import base64
+import json
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Курсор повреждён или выдан для другого списка"""
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _parses(parse: Callable[[str], Any]) -> Callable[[Any], bool]:
+    def check(value: Any) -> bool:
+        if not isinstance(value, str):
+            return False
+        try:
+            parse(value)
+        except ValueError:
+            return False
+        return True
+    return check
+
+
+# Типы полей ключа сортировки: подделанное значение отклоняется здесь, а не ошибкой сравнения в SQL
+KEY_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    'date': _parses(date.fromisoformat),
+    'time': _parses(time.fromisoformat),
+    'timestamp': _parses(datetime.fromisoformat),
+    'int': _is_int,
+}
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Ключ сортировки последней строки в непрозрачную base64url-строку"""
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str], kinds: Sequence[str]) -> Optional[List[Any]]:
+    """Курсор из запроса в список значений ключа с типами kinds (см. KEY_CHECKS); None для первой страницы"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+    if not isinstance(values, list) or len(values) != len(kinds):
+        raise InvalidCursor('Invalid cursor')
+    if not all(KEY_CHECKS[kind](value) for kind, value in zip(kinds, values)):
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def parse_limit(params: Dict[str, Any], default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Размер страницы из параметра limit в пределах 1..MAX_PAGE_SIZE"""
+    try:
+        limit = int(params.get('limit') or default)
+    except (TypeError, ValueError):
+        limit = default
+    return min(max(limit, 1), MAX_PAGE_SIZE)
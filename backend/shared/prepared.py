@@ -0,0 +1,65 @@
+'''
+Business: Реестр подготовленных запросов - горячие SQL разбираются и планируются один раз на подключение
+Args: PREPARED_STATEMENTS=0 - выполнять обычными запросами (нужно за пулером в режиме транзакций)
+Returns: prepare(name, sql) при импорте модуля функции, statement.execute(cursor, params) в обработчике
+'''
+
+import os
+import re
+from typing import Any, Dict, Sequence
+
+PREPARED_STATEMENTS = os.environ.get('PREPARED_STATEMENTS', '1') != '0'
+
+PLACEHOLDER = re.compile(r'(?<!%)%s')
+
+# Если сессия потеряла или уже имеет запрос (DISCARD ALL, пулер), учёт подключения исправляется
+# и ошибка пробрасывается: текущая транзакция всё равно прервана, следующий вызов пройдёт
+INVALID_SQL_STATEMENT_NAME = '26000'
+DUPLICATE_PREPARED_STATEMENT = '42P05'
+
+
+class PreparedStatement:
+    """Запрос с именем: PREPARE при первом выполнении на подключении, дальше EXECUTE по имени"""
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        self.param_count = len(PLACEHOLDER.findall(sql))
+        counter = iter(range(1, self.param_count + 1))
+        self.prepare_sql = f'PREPARE {name} AS ' + PLACEHOLDER.sub(lambda _: f'${next(counter)}', sql)
+        self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * self.param_count)})" if self.param_count \
+            else f'EXECUTE {name}'
+
+    def execute(self, cursor, params: Sequence[Any] = ()) -> None:
+        """Выполнить на курсоре; подключения без учёта подготовленных запросов получают обычный execute"""
+        prepared = getattr(cursor.connection, 'prepared', None)
+        if not PREPARED_STATEMENTS or prepared is None:
+            cursor.execute(self.sql, params)
+            return
+        try:
+            if self.name not in prepared:
+                cursor.execute(self.prepare_sql)
+                prepared.add(self.name)
+            cursor.execute(self.execute_sql, params)
+        except Exception as e:
+            code = getattr(e, 'pgcode', None)
+            if code == INVALID_SQL_STATEMENT_NAME:
+                prepared.discard(self.name)
+            elif code == DUPLICATE_PREPARED_STATEMENT:
+                prepared.add(self.name)
+            raise
+
+
+STATEMENTS: Dict[str, PreparedStatement] = {}
+
+
+def prepare(name: str, sql: str) -> PreparedStatement:
+    """Зарегистрировать запрос под именем; одно имя нельзя использовать для разных текстов"""
+    statement = STATEMENTS.get(name)
+    if statement is not None:
+        if statement.sql != sql:
+            raise ValueError(f'Prepared statement {name} is already registered with different SQL')
+        return statement
+    statement = PreparedStatement(name, sql)
+    STATEMENTS[name] = statement
+    return statement
@@ -0,0 +1,56 @@
+'''
+Business: Напоминания о предстоящих записях - все напоминания запуска ставятся в notification_outbox
+          одним INSERT ... SELECT по диапазону (booking_date, start_time) активных записей
+Args: conn - подключение к основной базе, day_hours/soon_hours - за сколько часов до начала напоминать
+Returns: число найденных записей и поставленных напоминаний по видам; доставляет их воркер outbox
+'''
+
+from typing import Any, Dict
+
+REMINDER_DAY = 'booking_reminder_day'
+REMINDER_SOON = 'booking_reminder_soon'
+
+
+def schedule_reminders(conn, day_hours: float = 24, soon_hours: float = 2) -> Dict[str, Any]:
+    """
+    Записи, начинающиеся в ближайшие day_hours часов: за soon_hours и меньше - напоминание «скоро»,
+    раньше - напоминание с датой. Окно «скоро» может переходить через полночь, поэтому его текст
+    говорит «сегодня» или «завтра» по дате записи относительно текущей. Уже поставленные напоминания пропускает уникальный индекс,
+    поэтому пропущенные запуски догоняются, а повторные ничего не добавляют
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """WITH bounds AS (
+               SELECT LOCALTIMESTAMP AS now_at,
+                      LOCALTIMESTAMP + %(soon)s * interval '1 hour' AS soon_until,
+                      LOCALTIMESTAMP + %(day)s * interval '1 hour' AS day_until
+           ), due AS (
+               SELECT b.id, b.client_id, b.booking_date, b.start_time, bounds.now_at::date AS today,
+                      CASE WHEN b.booking_date + b.start_time <= bounds.soon_until
+                           THEN %(soon_type)s ELSE %(day_type)s END AS type
+               FROM bookings b, bounds
+               WHERE b.status IN ('pending', 'confirmed')
+                 AND b.booking_date BETWEEN bounds.now_at::date AND bounds.day_until::date
+                 AND (b.booking_date, b.start_time) > (bounds.now_at::date, bounds.now_at::time)
+                 AND (b.booking_date, b.start_time) <= (bounds.day_until::date, bounds.day_until::time)
+           ), inserted AS (
+               INSERT INTO notification_outbox (user_id, booking_id, type, title, message)
+               SELECT client_id, id, type,
+                      CASE WHEN type = %(soon_type)s THEN 'Скоро запись' ELSE 'Напоминание о записи' END,
+                      'Ваша запись ' ||
+                      CASE WHEN type = %(soon_type)s AND booking_date = today THEN 'сегодня'
+                           WHEN type = %(soon_type)s AND booking_date = today + 1 THEN 'завтра'
+                           ELSE to_char(booking_date, 'DD.MM.YYYY')
+                      END || ' в ' || to_char(start_time, 'HH24:MI')
+               FROM due
+               ON CONFLICT (booking_id, type) WHERE type IN ('booking_reminder_day', 'booking_reminder_soon')
+               DO NOTHING
+               RETURNING type
+           )
+           SELECT (SELECT COUNT(*) FROM due) AS due,
+                  (SELECT COUNT(*) FROM inserted WHERE type = %(day_type)s) AS day,
+                  (SELECT COUNT(*) FROM inserted WHERE type = %(soon_type)s) AS soon""",
+        {'day': day_hours, 'soon': soon_hours, 'day_type': REMINDER_DAY, 'soon_type': REMINDER_SOON}
+    )
+    row = cursor.fetchone()
+    return {'due': row['due'], REMINDER_DAY: row['day'], REMINDER_SOON: row['soon']}
@@ -0,0 +1,158 @@
+'''
+Business: Расчёт свободных слотов мастера по отсортированным интервалам в минутах
+Args: рабочее окно мастера, занятые интервалы, длительность услуги и шаг сетки
+Returns: списки времён начала, в которые услуга целиком помещается в свободное время
+'''
+
+import heapq
+from typing import Any, Dict, Iterable, List, Tuple
+from datetime import date, datetime, time, timedelta
+
+SLOT_STEP_MINUTES = 30
+# Наибольшее число дней (включая обе границы) в диапазоне слотов и горизонте поиска ближайших
+MAX_RANGE_DAYS = 62
+
+Interval = Tuple[int, int]
+
+
+def parse_date_range(date_from: str, date_to: str, max_days: int = MAX_RANGE_DAYS) -> Tuple[date, date]:
+    """Разобрать границы диапазона YYYY-MM-DD (включительно); ValueError для неверных дат, обратного или слишком длинного диапазона"""
+    try:
+        parsed_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+        parsed_to = datetime.strptime(date_to, '%Y-%m-%d').date()
+    except (TypeError, ValueError) as e:
+        raise ValueError('Parameters "from" and "to" must be YYYY-MM-DD dates') from e
+    if parsed_to < parsed_from:
+        raise ValueError('Parameter "to" must not be earlier than "from"')
+    # Обе границы входят в диапазон: в нём (to - from).days + 1 дней
+    if (parsed_to - parsed_from).days > max_days - 1:
+        raise ValueError(f'Date range must span at most {max_days} days')
+    return parsed_from, parsed_to
+
+
+def to_minutes(value: time) -> int:
+    """Время суток в минутах от полуночи"""
+    return value.hour * 60 + value.minute
+
+
+def format_minutes(minutes: int) -> str:
+    """Минуты от полуночи в строку HH:MM"""
+    return '%02d:%02d' % divmod(minutes, 60)
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Отсортировать и слить пересекающиеся/смежные интервалы [start, end)"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_slot_starts(work_start: int, work_end: int, busy: Iterable[Interval],
+                     duration: int = SLOT_STEP_MINUTES, step: int = SLOT_STEP_MINUTES) -> List[int]:
+    """Начала слотов на сетке от work_start, где [start, start + duration) не пересекает занятое время"""
+    result: List[int] = []
+    cursor = work_start
+
+    for busy_start, busy_end in merge_intervals(busy) + [(work_end, work_end)]:
+        gap_end = min(busy_start, work_end)
+        if cursor < gap_end:
+            offset = (cursor - work_start) % step
+            start = cursor if offset == 0 else cursor + step - offset
+            while start + duration <= gap_end:
+                result.append(start)
+                start += step
+        if busy_end > cursor:
+            cursor = busy_end
+        if cursor >= work_end:
+            break
+
+    return result
+
+
+def day_slots(schedule: Dict[str, Any], booked: Iterable[Dict[str, Any]],
+              duration: int = SLOT_STEP_MINUTES) -> List[str]:
+    """Свободные слоты на один день по строке master_schedule и строкам bookings"""
+    busy = [(to_minutes(b['start_time']), to_minutes(b['end_time'])) for b in booked]
+    starts = free_slot_starts(to_minutes(schedule['start_time']), to_minutes(schedule['end_time']),
+                              busy, duration)
+    return [format_minutes(m) for m in starts]
+
+
+def range_slots(schedules: Iterable[Dict[str, Any]], booked: Iterable[Dict[str, Any]],
+                date_from: date, date_to: date, duration: int = SLOT_STEP_MINUTES) -> Dict[str, List[str]]:
+    """Свободные слоты на каждый день диапазона за один проход по расписанию и броням"""
+    schedule_by_weekday = {s['day_of_week']: s for s in schedules}
+
+    busy_by_date: Dict[date, List[Interval]] = {}
+    for b in booked:
+        busy_by_date.setdefault(b['booking_date'], []).append(
+            (to_minutes(b['start_time']), to_minutes(b['end_time']))
+        )
+
+    days: Dict[str, List[str]] = {}
+    current = date_from
+    while current <= date_to:
+        schedule = schedule_by_weekday.get(current.isoweekday())
+        if schedule:
+            starts = free_slot_starts(to_minutes(schedule['start_time']), to_minutes(schedule['end_time']),
+                                      busy_by_date.get(current, []), duration)
+            days[current.isoformat()] = [format_minutes(m) for m in starts]
+        else:
+            days[current.isoformat()] = []
+        current += timedelta(days=1)
+
+    return days
+
+
+def earliest_slots(offers: Iterable[Dict[str, Any]], schedules: Iterable[Dict[str, Any]],
+                   booked: Iterable[Dict[str, Any]], date_from: date, date_to: date,
+                   limit: int, not_before: int = 0) -> List[Dict[str, Any]]:
+    """Первые limit свободных слотов по всем мастерам: дни по порядку, внутри дня слияние по времени"""
+    offer_by_master = {o['master_id']: o for o in offers}
+
+    schedule_by_master: Dict[int, Dict[int, Dict[str, Any]]] = {}
+    for s in schedules:
+        schedule_by_master.setdefault(s['master_id'], {})[s['day_of_week']] = s
+
+    busy: Dict[Tuple[int, date], List[Interval]] = {}
+    for b in booked:
+        busy.setdefault((b['master_id'], b['booking_date']), []).append(
+            (to_minutes(b['start_time']), to_minutes(b['end_time']))
+        )
+
+    result: List[Dict[str, Any]] = []
+    current = date_from
+    while current <= date_to and len(result) < limit:
+        weekday = current.isoweekday()
+        day_candidates: List[Tuple[int, int]] = []
+
+        for master_id, by_weekday in schedule_by_master.items():
+            schedule = by_weekday.get(weekday)
+            offer = offer_by_master.get(master_id)
+            if not schedule or not offer:
+                continue
+            starts = free_slot_starts(to_minutes(schedule['start_time']), to_minutes(schedule['end_time']),
+                                      busy.get((master_id, current), []), offer['duration_minutes'])
+            floor = not_before if current == date_from else 0
+            for start in starts:
+                if start >= floor:
+                    day_candidates.append((start, master_id))
+
+        for start, master_id in heapq.nsmallest(limit - len(result), day_candidates):
+            offer = offer_by_master[master_id]
+            result.append({
+                'date': current.isoformat(),
+                'time': format_minutes(start),
+                'masterId': master_id,
+                'masterName': offer['master_name'],
+                'serviceId': offer['service_id'],
+                'duration': offer['duration_minutes']
+            })
+        current += timedelta(days=1)
+
+    return result
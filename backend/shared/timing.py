@@ -0,0 +1,162 @@
+'''
+Business: Инструментирование запросов - фазы обработки, длительность и число строк каждого SQL, медленные запросы
+Args: SQL_SLOW_MS - порог медленного запроса в мс, REQUEST_LOG=0 - отключить структурный лог запросов
+Returns: заголовок Server-Timing в ответе handler и JSON-строка лога на каждый запрос
+'''
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+SQL_SLOW_MS = float(os.environ.get('SQL_SLOW_MS', '100'))
+REQUEST_LOG = os.environ.get('REQUEST_LOG', '1') != '0'
+
+_current = threading.local()
+_cursor_class = None
+
+
+class RequestTimer:
+    """Замеры одного вызова handler, привязанные к context.request_id"""
+
+    def __init__(self, request_id: Optional[str], function_name: Optional[str]):
+        self.request_id = request_id
+        self.function_name = function_name
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.query_count = 0
+        self.query_ms = 0.0
+        self.rows = 0
+        self.slow_queries: List[Dict[str, Any]] = []
+
+    def add_phase(self, name: str, ms: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + ms
+
+    def record_query(self, sql: str, params: Any, ms: float, rowcount: int) -> None:
+        self.query_count += 1
+        self.query_ms += ms
+        if rowcount > 0:
+            self.rows += rowcount
+        if ms >= SQL_SLOW_MS:
+            self.slow_queries.append({
+                'ms': round(ms, 2),
+                'rows': rowcount,
+                'sql': ' '.join(sql.split()),
+                'params': params_shape(params)
+            })
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self, total_ms: float) -> str:
+        entries = [f'{name};dur={ms:.2f}' for name, ms in self.phases.items()]
+        entries.append(f'db;dur={self.query_ms:.2f};desc="{self.query_count} queries"')
+        entries.append(f'total;dur={total_ms:.2f}')
+        return ', '.join(entries)
+
+
+def params_shape(params: Any) -> Any:
+    """Типы и размеры параметров запроса без самих значений"""
+    def shape(value: Any) -> str:
+        if isinstance(value, (list, tuple)):
+            return f'{type(value).__name__}[{len(value)}]'
+        if isinstance(value, str):
+            return f'str({len(value)})'
+        return type(value).__name__
+
+    if isinstance(params, dict):
+        return {key: shape(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [shape(value) for value in params]
+    return shape(params) if params is not None else None
+
+
+def current_timer() -> Optional[RequestTimer]:
+    return getattr(_current, 'timer', None)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Замерить фазу обработки; вне instrument() ничего не делает"""
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add_phase(name, (time.perf_counter() - started) * 1000)
+
+
+def timed(name: str) -> Callable:
+    """Декоратор: вызов функции записывается как фаза name"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrumented_cursor_class():
+    """RealDictCursor, который записывает длительность и число строк каждого запроса в текущий RequestTimer"""
+    global _cursor_class
+    if _cursor_class is None:
+        from psycopg2.extras import RealDictCursor
+
+        class InstrumentedCursor(RealDictCursor):
+            def execute(self, query, vars=None):
+                started = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    timer = current_timer()
+                    if timer is not None:
+                        timer.record_query(query if isinstance(query, str) else str(query), vars,
+                                           (time.perf_counter() - started) * 1000, self.rowcount)
+
+        _cursor_class = InstrumentedCursor
+    return _cursor_class
+
+
+def instrument(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    """Обернуть handler: Server-Timing в ответе и структурный лог с фазами и медленными запросами"""
+    @functools.wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        if event.get('httpMethod') == 'OPTIONS':
+            return handler(event, context)
+
+        timer = RequestTimer(getattr(context, 'request_id', None), getattr(context, 'function_name', None))
+        _current.timer = timer
+        try:
+            response = handler(event, context)
+        finally:
+            _current.timer = None
+
+        total_ms = timer.total_ms()
+        headers = dict(response.get('headers') or {})
+        headers['Server-Timing'] = timer.server_timing(total_ms)
+        headers['Timing-Allow-Origin'] = '*'
+
+        if REQUEST_LOG:
+            print(json.dumps({
+                'requestId': timer.request_id,
+                'function': timer.function_name,
+                'method': event.get('httpMethod'),
+                'status': response.get('statusCode'),
+                'totalMs': round(total_ms, 2),
+                'phases': {name: round(ms, 2) for name, ms in timer.phases.items()},
+                'queries': timer.query_count,
+                'queryMs': round(timer.query_ms, 2),
+                'rows': timer.rows,
+                'slowQueries': timer.slow_queries
+            }, ensure_ascii=False), flush=True)
+
+        return {**response, 'headers': headers}
+
+    return wrapper
@@ -0,0 +1,97 @@
+'''
+Business: Определение пользователя по данным Telegram - upsert одним запросом и кэш telegram_id -> user_id
+Args: conn - подключение из пула, telegram_user - dict с id, first_name, last_name, username
+Returns: id пользователя в таблице users
+'''
+
+import os
+from typing import Any, Dict, Optional
+
+from shared.cache import LRUCache
+from shared.db import get_db_connection, is_read_only, mark_write, release_connection
+from shared.prepared import prepare
+from shared.timing import timed
+
+IDENTITY_CACHE = LRUCache(
+    max_size=int(os.environ.get('IDENTITY_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('IDENTITY_CACHE_TTL', '3600'))
+)
+
+USER_BY_TELEGRAM_ID = prepare('users_by_telegram_id', "SELECT id FROM users WHERE telegram_id = %s")
+USER_ROLE = prepare('users_role', "SELECT role FROM users WHERE id = %s")
+
+# ON CONFLICT DO NOTHING не пишет в существующую строку; если параллельный запрос
+# вставил пользователя после снимка, оба подзапроса пусты и запрос повторяется
+UPSERT_USER = prepare('users_upsert', """
+    WITH inserted AS (
+        INSERT INTO users (telegram_id, first_name, last_name, username, role)
+        VALUES (%s, %s, %s, %s, 'client')
+        ON CONFLICT (telegram_id) DO NOTHING
+        RETURNING id
+    )
+    SELECT id, true AS created FROM inserted
+    UNION ALL
+    SELECT id, false AS created FROM users WHERE telegram_id = %s
+    LIMIT 1""")
+
+
+@timed('user')
+def resolve_user_id(conn, telegram_user: Dict[str, Any], create: bool = True) -> Optional[int]:
+    """Получить (или создать при create=True) пользователя; повторные запросы тёплого контейнера не ходят в базу"""
+    telegram_id = telegram_user.get('id')
+
+    user_id = IDENTITY_CACHE.get(telegram_id)
+    if user_id is not None:
+        return user_id
+
+    if create and is_read_only(conn):
+        # Реплика не принимает INSERT: новый пользователь создаётся через подключение к основной базе
+        user_id = resolve_user_id(conn, telegram_user, create=False)
+        if user_id is None:
+            primary = get_db_connection()
+            try:
+                user_id = resolve_user_id(primary, telegram_user)
+            finally:
+                release_connection(primary)
+            mark_write(telegram_id)
+        return user_id
+
+    cursor = conn.cursor()
+
+    if not create:
+        USER_BY_TELEGRAM_ID.execute(cursor, (telegram_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        IDENTITY_CACHE.set(telegram_id, row['id'])
+        return row['id']
+
+    params = (
+        telegram_id,
+        telegram_user.get('first_name', 'User'),
+        telegram_user.get('last_name', ''),
+        telegram_user.get('username', ''),
+        telegram_id
+    )
+
+    for _ in range(2):
+        UPSERT_USER.execute(cursor, params)
+        row = cursor.fetchone()
+        if row:
+            break
+    else:
+        raise RuntimeError(f'Failed to resolve user {telegram_id}')
+
+    if row['created']:
+        conn.commit()
+
+    IDENTITY_CACHE.set(telegram_id, row['id'])
+    return row['id']
+
+
+def is_master(conn, user_id: int) -> bool:
+    """Пользователь зарегистрирован как мастер (role = 'master')"""
+    cursor = conn.cursor()
+    USER_ROLE.execute(cursor, (user_id,))
+    row = cursor.fetchone()
+    return bool(row) and row['role'] == 'master'
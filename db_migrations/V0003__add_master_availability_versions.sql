@@ -0,0 +1,11 @@
+-- Версии доступности мастеров для инвалидации кэша свободных слотов
+
+-- Счётчик увеличивается при каждом создании и отмене записи к мастеру
+CREATE TABLE master_availability_versions (
+    master_id BIGINT PRIMARY KEY REFERENCES users(id),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO master_availability_versions (master_id)
+SELECT id FROM users WHERE role = 'master';
@@ -0,0 +1,9 @@
+-- Индексы для курсорной пагинации истории бронирований и уведомлений
+
+-- Порядок колонок совпадает с ORDER BY в обработчиках: любая страница - диапазонное сканирование индекса
+CREATE INDEX idx_bookings_client_history ON bookings(client_id, booking_date DESC, start_time DESC, id DESC);
+CREATE INDEX idx_notifications_user_feed ON notifications(user_id, created_at DESC, id DESC);
+
+-- Одноколоночные индексы покрываются префиксом новых составных
+DROP INDEX idx_bookings_client;
+DROP INDEX idx_notifications_user;
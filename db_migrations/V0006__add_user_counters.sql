@@ -0,0 +1,13 @@
+-- Поддерживаемые счётчики вместо COUNT(*) при каждом чтении профиля и уведомлений
+
+ALTER TABLE users ADD COLUMN bookings_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN unread_notifications_count INTEGER NOT NULL DEFAULT 0;
+
+-- Начальное заполнение по текущим данным
+UPDATE users u SET bookings_count = c.count
+FROM (SELECT client_id, COUNT(*) AS count FROM bookings GROUP BY client_id) c
+WHERE c.client_id = u.id;
+
+UPDATE users u SET unread_notifications_count = c.count
+FROM (SELECT user_id, COUNT(*) AS count FROM notifications WHERE is_read = false GROUP BY user_id) c
+WHERE c.user_id = u.id;
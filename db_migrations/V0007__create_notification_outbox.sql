@@ -0,0 +1,20 @@
+-- Транзакционный outbox: обработчики только добавляют событие, уведомления создаёт и доставляет воркер
+
+CREATE TABLE notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL REFERENCES users(id),
+    booking_id BIGINT REFERENCES bookings(id),
+    type VARCHAR(50) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    message TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'delivered', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    notification_id BIGINT,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+-- Воркер выбирает только ожидающие события, индекс не растёт за счёт обработанных
+CREATE INDEX idx_notification_outbox_pending ON notification_outbox(next_attempt_at, id) WHERE status = 'pending';
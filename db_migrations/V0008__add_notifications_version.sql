@@ -0,0 +1,7 @@
+-- Версия ленты уведомлений пользователя для условных GET (ETag / 304)
+
+-- Увеличивается при появлении новых уведомлений и при отметке прочитанными
+ALTER TABLE users ADD COLUMN notifications_version BIGINT NOT NULL DEFAULT 0;
+
+-- Дельта-запросы since_id читают только новые строки пользователя
+CREATE INDEX idx_notifications_user_id_id ON notifications(user_id, id);
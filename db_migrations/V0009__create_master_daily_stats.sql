@@ -0,0 +1,29 @@
+-- Ежедневные агрегаты мастера: поддерживаются обработчиками при создании, отмене и завершении записей,
+-- дашборд читает их вместо bookings JOIN services за весь период
+
+CREATE TABLE master_daily_stats (
+    master_id BIGINT NOT NULL REFERENCES users(id),
+    stat_date DATE NOT NULL,
+    bookings_count INTEGER NOT NULL DEFAULT 0,
+    cancelled_count INTEGER NOT NULL DEFAULT 0,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    booked_minutes INTEGER NOT NULL DEFAULT 0,
+    booked_revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    completed_revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (master_id, stat_date)
+);
+
+-- Начальное заполнение по текущим данным; повторный пересчёт - backend/jobs/backfill_master_stats.py
+INSERT INTO master_daily_stats (master_id, stat_date, bookings_count, cancelled_count, completed_count,
+                                booked_minutes, booked_revenue, completed_revenue)
+SELECT b.master_id, b.booking_date,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE b.status = 'cancelled'),
+       COUNT(*) FILTER (WHERE b.status = 'completed'),
+       COALESCE(SUM(EXTRACT(EPOCH FROM b.end_time - b.start_time) / 60) FILTER (WHERE b.status != 'cancelled'), 0),
+       COALESCE(SUM(s.price) FILTER (WHERE b.status != 'cancelled'), 0),
+       COALESCE(SUM(s.price) FILTER (WHERE b.status = 'completed'), 0)
+FROM bookings b
+JOIN services s ON s.id = b.service_id
+GROUP BY b.master_id, b.booking_date;
@@ -0,0 +1,156 @@
+-- Декларативное секционирование по месяцам: bookings по booking_date, notifications по created_at.
+-- Запросы обработчиков с условием на дату читают только нужные секции, старые уведомления
+-- отключаются целой секцией (backend/jobs/partition_maintenance.py) вместо DELETE по всей таблице
+
+-- Секции уведомлений, вышедшие за срок хранения, переносятся сюда
+CREATE SCHEMA IF NOT EXISTS archive;
+
+-- Создать месячную секцию parent, содержащую month_start; строки этого месяца из секции по умолчанию
+-- переносятся в новую секцию до ATTACH. Для bookings на секцию вешается ограничение против пересечений:
+-- запись не переходит через полночь, поэтому пересекающиеся записи всегда лежат в одной секции.
+-- Переносимые строки уже прошли ограничение bookings_master_no_overlap из V0004 (устаревшие записи
+-- отменены там и перечислены в bookings_overlap_cleanup), поэтому ADD CONSTRAINT на них не падает
+CREATE OR REPLACE FUNCTION create_month_partition(parent text, key_column text, month_start date)
+RETURNS text
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    range_start date := date_trunc('month', month_start)::date;
+    range_end date := (date_trunc('month', month_start) + interval '1 month')::date;
+    child text := format('%s_%s', parent, to_char(month_start, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(child) IS NOT NULL THEN
+        RETURN child;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', child, parent);
+    EXECUTE format('INSERT INTO %I SELECT * FROM %I WHERE %I >= %L AND %I < %L',
+                   child, parent || '_default', key_column, range_start, key_column, range_end);
+    EXECUTE format('DELETE FROM %I WHERE %I >= %L AND %I < %L',
+                   parent || '_default', key_column, range_start, key_column, range_end);
+
+    IF parent = 'bookings' THEN
+        EXECUTE format(
+            'ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist ('
+            '    master_id WITH =,'
+            '    tsrange(booking_date + start_time, booking_date + end_time, ''[)'') WITH &&'
+            ') WHERE (status != ''cancelled'')',
+            child, child || '_no_overlap');
+    END IF;
+
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   parent, child, range_start, range_end);
+    RETURN child;
+END;
+$$;
+
+-- Первичный ключ секционированной таблицы обязан включать ключ секционирования, поэтому внешний ключ
+-- на bookings(id) невозможен; booking_id в уведомлениях и outbox остаётся ссылкой без ограничения
+ALTER TABLE notifications DROP CONSTRAINT IF EXISTS notifications_booking_id_fkey;
+ALTER TABLE notification_outbox DROP CONSTRAINT IF EXISTS notification_outbox_booking_id_fkey;
+
+-- bookings
+
+ALTER TABLE bookings RENAME TO bookings_unpartitioned;
+ALTER TABLE bookings_unpartitioned RENAME CONSTRAINT bookings_pkey TO bookings_unpartitioned_pkey;
+
+CREATE TABLE bookings (
+    id BIGINT NOT NULL DEFAULT nextval('bookings_id_seq'),
+    client_id BIGINT NOT NULL REFERENCES users(id),
+    master_id BIGINT NOT NULL REFERENCES users(id),
+    service_id INTEGER NOT NULL REFERENCES services(id),
+    booking_date DATE NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'confirmed', 'completed', 'cancelled')),
+    notes TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, booking_date)
+) PARTITION BY RANGE (booking_date);
+
+-- Даты вне созданных секций (например, запись на год вперёд) не отклоняются
+CREATE TABLE bookings_default PARTITION OF bookings DEFAULT;
+ALTER TABLE bookings_default ADD CONSTRAINT bookings_default_no_overlap
+    EXCLUDE USING gist (
+        master_id WITH =,
+        tsrange(booking_date + start_time, booking_date + end_time, '[)') WITH &&
+    ) WHERE (status != 'cancelled');
+
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(COALESCE(MIN(booking_date), CURRENT_DATE), CURRENT_DATE)),
+            date_trunc('month', CURRENT_DATE) + interval '3 months',
+            interval '1 month'
+        )::date
+        FROM bookings_unpartitioned
+    LOOP
+        PERFORM create_month_partition('bookings', 'booking_date', month);
+    END LOOP;
+END;
+$$;
+
+INSERT INTO bookings (id, client_id, master_id, service_id, booking_date, start_time, end_time,
+                      status, notes, created_at, updated_at)
+SELECT id, client_id, master_id, service_id, booking_date, start_time, end_time,
+       status, notes, created_at, updated_at
+FROM bookings_unpartitioned;
+
+ALTER SEQUENCE bookings_id_seq OWNED BY bookings.id;
+DROP TABLE bookings_unpartitioned;
+
+-- Индексы создаются на родителе и наследуются всеми секциями, в том числе будущими.
+-- idx_bookings_date и idx_bookings_status заменены отсечением секций и индексом по мастеру и дате
+CREATE INDEX idx_bookings_client_history ON bookings(client_id, booking_date DESC, start_time DESC, id DESC);
+CREATE INDEX idx_bookings_master_date ON bookings(master_id, booking_date);
+
+-- notifications
+
+ALTER TABLE notifications RENAME TO notifications_unpartitioned;
+ALTER TABLE notifications_unpartitioned RENAME CONSTRAINT notifications_pkey TO notifications_unpartitioned_pkey;
+
+CREATE TABLE notifications (
+    id BIGINT NOT NULL DEFAULT nextval('notifications_id_seq'),
+    user_id BIGINT NOT NULL REFERENCES users(id),
+    booking_id BIGINT,
+    type VARCHAR(50) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    message TEXT NOT NULL,
+    is_read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE notifications_default PARTITION OF notifications DEFAULT;
+
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(COALESCE(MIN(created_at), CURRENT_DATE), CURRENT_DATE)),
+            date_trunc('month', CURRENT_DATE) + interval '3 months',
+            interval '1 month'
+        )::date
+        FROM notifications_unpartitioned
+    LOOP
+        PERFORM create_month_partition('notifications', 'created_at', month);
+    END LOOP;
+END;
+$$;
+
+INSERT INTO notifications (id, user_id, booking_id, type, title, message, is_read, created_at)
+SELECT id, user_id, booking_id, type, title, message, is_read, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM notifications_unpartitioned;
+
+ALTER SEQUENCE notifications_id_seq OWNED BY notifications.id;
+DROP TABLE notifications_unpartitioned;
+
+CREATE INDEX idx_notifications_user_feed ON notifications(user_id, created_at DESC, id DESC);
+CREATE INDEX idx_notifications_user_id_id ON notifications(user_id, id);
+CREATE INDEX idx_notifications_unread ON notifications(user_id, is_read);
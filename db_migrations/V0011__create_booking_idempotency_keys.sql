@@ -0,0 +1,14 @@
+-- Ключи идемпотентности создания записи: повтор POST с тем же Idempotency-Key возвращает исходный bookingId
+
+CREATE TABLE booking_idempotency_keys (
+    user_id BIGINT NOT NULL REFERENCES users(id),
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    booking_id BIGINT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+-- Очистка просроченных ключей (backend/jobs/cleanup_idempotency_keys.py)
+CREATE INDEX idx_booking_idempotency_keys_expires ON booking_idempotency_keys(expires_at);
@@ -0,0 +1,9 @@
+-- Планировщик напоминаний: одно диапазонное сканирование предстоящих активных записей
+-- и защита от повторной постановки напоминания в outbox
+
+CREATE INDEX idx_bookings_upcoming ON bookings(booking_date, start_time)
+    WHERE status IN ('pending', 'confirmed');
+
+-- Одно напоминание каждого вида на запись: повторный запуск планировщика ничего не добавляет
+CREATE UNIQUE INDEX idx_notification_outbox_reminder_once ON notification_outbox(booking_id, type)
+    WHERE type IN ('booking_reminder_day', 'booking_reminder_soon');
@@ -101,12 +101,14 @@ const NotificationBell = () => {
                     <div className={`p-2 rounded-full ${
                       notification.type === 'booking_created' ? 'bg-green-100' :
                       notification.type === 'booking_cancelled' ? 'bg-red-100' :
+                      notification.type.startsWith('booking_reminder') ? 'bg-amber-100' :
                       'bg-blue-100'
                     }`}>
                       <Icon 
                         name={
                           notification.type === 'booking_created' ? 'CheckCircle' :
                           notification.type === 'booking_cancelled' ? 'XCircle' :
+                          notification.type.startsWith('booking_reminder') ? 'Clock' :
                           'Info'
                         } 
                         size={16}
@@ -1,11 +1,21 @@
 import { getTelegramUser } from './telegram';
 import urls from '../../backend/func2url.json';
 
-const API_URLS = {
-  bookings: urls.bookings,
-  notifications: urls.notifications,
-  profile: urls.profile,
-};
+// VITE_API_BASE_URL указывает на самостоятельно размещённый backend/server.py, где все функции
+// доступны по путям /bookings, /notifications и /profile одного адреса
+const API_BASE_URL = (import.meta.env.VITE_API_BASE_URL as string | undefined)?.replace(/\/+$/, '');
+
+const API_URLS = API_BASE_URL
+  ? {
+      bookings: `${API_BASE_URL}/bookings`,
+      notifications: `${API_BASE_URL}/notifications`,
+      profile: `${API_BASE_URL}/profile`,
+    }
+  : {
+      bookings: urls.bookings,
+      notifications: urls.notifications,
+      profile: urls.profile,
+    };
 
 export interface Booking {
   id: number;
@@ -19,6 +29,32 @@ export interface Booking {
   notes?: string;
 }
 
+export interface EarliestSlot {
+  date: string;
+  time: string;
+  masterId: number;
+  masterName: string;
+  serviceId: number;
+  duration: number;
+}
+
+export interface BatchResult {
+  id: number;
+  status: string;
+}
+
+export interface MasterStats {
+  scheduledMinutes: number;
+  bookedMinutes: number;
+  occupancy: number | null;
+  bookings: number;
+  cancelled: number;
+  completed: number;
+  cancellationRate: number | null;
+  bookedRevenue: number;
+  revenue: number;
+}
+
 export interface Notification {
   id: number;
   type: string;
@@ -40,12 +76,24 @@ export interface UserProfile {
   createdAt: string;
 }
 
+// После своей записи чтения идут в основную базу, а не в реплику, чтобы пользователь видел изменения
+const READ_PRIMARY_WINDOW_MS = 5000;
+let lastWriteAt = 0;
+
+const CREATE_BOOKING_ATTEMPTS = 3;
+
 async function fetchWithAuth(url: string, options: RequestInit = {}) {
   const telegramUser = getTelegramUser();
+  const isRead = !options.method || options.method === 'GET';
+  
+  if (!isRead) {
+    lastWriteAt = Date.now();
+  }
   
   const headers = {
     'Content-Type': 'application/json',
     'X-Telegram-User': JSON.stringify(telegramUser),
+    ...(isRead && Date.now() - lastWriteAt < READ_PRIMARY_WINDOW_MS ? { 'X-Read-Primary': '1' } : {}),
     ...options.headers,
   };
 
@@ -68,12 +116,40 @@ export const bookingsApi = {
     return data.bookings;
   },
 
+  async getBookingsPage(cursor?: string, limit = 50): Promise<{ bookings: Booking[]; nextCursor: string | null }> {
+    let url = `${API_URLS.bookings}?limit=${limit}`;
+    if (cursor) {
+      url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    return fetchWithAuth(url);
+  },
+
   async getAvailableSlots(masterId: number, date: string): Promise<string[]> {
     const url = `${API_URLS.bookings}?action=slots&master_id=${masterId}&date=${date}`;
     const data = await fetchWithAuth(url);
     return data.slots;
   },
 
+  async getAvailableSlotsRange(
+    masterId: number,
+    from: string,
+    to: string,
+    duration?: number
+  ): Promise<Record<string, string[]>> {
+    let url = `${API_URLS.bookings}?action=slots_range&master_id=${masterId}&from=${from}&to=${to}`;
+    if (duration) {
+      url += `&duration=${duration}`;
+    }
+    const data = await fetchWithAuth(url);
+    return data.days;
+  },
+
+  async getEarliestSlots(serviceId: number, days = 14, limit = 5): Promise<EarliestSlot[]> {
+    const url = `${API_URLS.bookings}?action=earliest&service_id=${serviceId}&days=${days}&limit=${limit}`;
+    const data = await fetchWithAuth(url);
+    return data.slots;
+  },
+
   async createBooking(booking: {
     masterId: number;
     serviceId: number;
@@ -83,21 +159,77 @@ export const bookingsApi = {
     notes?: string;
   }): Promise<{ success: boolean; bookingId: number }> {
     const telegramUser = getTelegramUser();
+    // Один ключ на все повторы: сервер вернёт исходный bookingId вместо второй записи
+    const idempotencyKey = crypto.randomUUID();
     
+    for (let attempt = 1; ; attempt++) {
+      try {
+        return await fetchWithAuth(API_URLS.bookings, {
+          method: 'POST',
+          headers: { 'Idempotency-Key': idempotencyKey },
+          body: JSON.stringify({
+            ...booking,
+            telegramUser,
+          }),
+        });
+      } catch (error) {
+        // fetch бросает TypeError, только если ответ не получен; ошибки сервера не повторяются
+        if (!(error instanceof TypeError) || attempt >= CREATE_BOOKING_ATTEMPTS) {
+          throw error;
+        }
+      }
+    }
+  },
+
+  async cancelBooking(bookingId: number): Promise<{ success: boolean }> {
     return fetchWithAuth(API_URLS.bookings, {
-      method: 'POST',
+      method: 'PUT',
       body: JSON.stringify({
-        ...booking,
-        telegramUser,
+        bookingId,
+        action: 'cancel',
       }),
     });
   },
 
-  async cancelBooking(bookingId: number): Promise<{ success: boolean }> {
+  async completeBooking(bookingId: number): Promise<{ success: boolean }> {
     return fetchWithAuth(API_URLS.bookings, {
       method: 'PUT',
       body: JSON.stringify({
         bookingId,
+        action: 'complete',
+      }),
+    });
+  },
+
+  async getMasterStats(
+    from: string,
+    to: string,
+    group: 'day' | 'week' = 'day'
+  ): Promise<{ periods: (MasterStats & { period: string })[]; totals: MasterStats }> {
+    return fetchWithAuth(`${API_URLS.bookings}?action=master_stats&from=${from}&to=${to}&group=${group}`);
+  },
+
+  async cancelBookings(
+    bookingIds: number[]
+  ): Promise<{ success: boolean; cancelled: number; results: BatchResult[] }> {
+    return fetchWithAuth(API_URLS.bookings, {
+      method: 'PUT',
+      body: JSON.stringify({
+        bookingIds,
+        action: 'cancel',
+      }),
+    });
+  },
+
+  async cancelMasterDays(
+    from: string,
+    to: string
+  ): Promise<{ success: boolean; cancelled: number; results: BatchResult[] }> {
+    return fetchWithAuth(API_URLS.bookings, {
+      method: 'PUT',
+      body: JSON.stringify({
+        from,
+        to,
         action: 'cancel',
       }),
     });
@@ -105,8 +237,11 @@ export const bookingsApi = {
 };
 
 export const notificationsApi = {
-  async getNotifications(): Promise<{ notifications: Notification[]; unreadCount: number }> {
-    return fetchWithAuth(API_URLS.notifications);
+  async getNotifications(
+    cursor?: string
+  ): Promise<{ notifications: Notification[]; unreadCount: number; nextCursor: string | null }> {
+    const url = cursor ? `${API_URLS.notifications}?cursor=${encodeURIComponent(cursor)}` : API_URLS.notifications;
+    return fetchWithAuth(url);
   },
 
   async markAsRead(notificationId: number): Promise<{ success: boolean }> {
@@ -116,6 +251,15 @@ export const notificationsApi = {
     });
   },
 
+  async markManyAsRead(
+    notificationIds: number[]
+  ): Promise<{ success: boolean; updated: number; results: BatchResult[] }> {
+    return fetchWithAuth(API_URLS.notifications, {
+      method: 'PUT',
+      body: JSON.stringify({ notificationIds }),
+    });
+  },
+
   async markAllAsRead(): Promise<{ success: boolean }> {
     return fetchWithAuth(API_URLS.notifications, {
       method: 'POST',
@@ -129,6 +273,15 @@ export const profileApi = {
     return fetchWithAuth(API_URLS.profile);
   },
 
+  async bootstrap(): Promise<{
+    profile: UserProfile;
+    bookings: Booking[];
+    notifications: Notification[];
+    unreadCount: number;
+  }> {
+    return fetchWithAuth(`${API_URLS.profile}?action=bootstrap`);
+  },
+
   async updateProfile(data: {
     firstName: string;
     lastName?: string;